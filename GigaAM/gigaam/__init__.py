@@ -1,14 +1,14 @@
 import logging
 import os
-import urllib.request
-from typing import Optional, Tuple, Union
+from typing import Dict, Optional, Tuple, Type, Union
 
 import torch
-from tqdm import tqdm
 
+from .download import download_file
 from .model import GigaAM, GigaAMASR, GigaAMEmo
 from .preprocess import load_audio
-from .utils import format_time
+from .quantization import QUANTIZATION_MODES, prepare_int8, quantize_int8
+from .utils import cpu_supports_bf16, format_time
 
 # Default cache directory
 _CACHE_DIR = os.path.expanduser("~/.cache/gigaam")
@@ -30,28 +30,7 @@ _MODEL_NAMES = [
 
 def _download_file(file_url: str, file_path: str) -> str:
     """Helper to download a file if not already cached."""
-    if os.path.exists(file_path):
-        return file_path
-
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    with urllib.request.urlopen(file_url) as source, open(file_path, "wb") as output:
-        with tqdm(
-            total=int(source.info().get("Content-Length", 0)),
-            ncols=80,
-            unit="iB",
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as loop:
-            while True:
-                buffer = source.read(8192)
-                if not buffer:
-                    break
-
-                output.write(buffer)
-                loop.update(len(buffer))
-
-    return file_path
+    return download_file(file_url, file_path)
 
 
 def _download_model(model_name: str, download_root: str) -> Tuple[str, str]:
@@ -80,12 +59,59 @@ def _download_tokenizer(model_name: str, download_root: str) -> Optional[str]:
     return _download_file(tokenizer_url, tokenizer_path)
 
 
+def _converted_path(
+    download_root: str,
+    model_name: str,
+    quantize: Optional[str],
+    quantize_joint: bool,
+    half_encoder: bool,
+) -> str:
+    """Path of the cached checkpoint with final (converted) weights."""
+    if quantize is not None:
+        suffix = f"_{quantize}_joint" if quantize_joint else f"_{quantize}"
+    else:
+        suffix = "_fp16" if half_encoder else "_fp32"
+    return os.path.join(download_root, model_name + suffix + ".ckpt")
+
+
+def _source_stamp(model_path: str) -> Dict[str, int]:
+    """Size and modification time of the source checkpoint, stored with converted weights."""
+    stat = os.stat(model_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _load_converted(
+    model_cls: Type[GigaAM], checkpoint: Dict, quantize: Optional[str], quantize_joint: bool
+) -> GigaAM:
+    """
+    Build a model from a converted checkpoint loaded with `mmap=True`.
+    Unquantized models are built on the meta device and take the mapped tensors
+    as their parameters (`assign=True`), so no weights are initialized or copied.
+    """
+    if quantize is not None:
+        model = model_cls(checkpoint["cfg"])
+        prepare_int8(model, quantize_joint)
+        model.load_state_dict(checkpoint["state_dict"])
+        return model.eval()
+
+    with torch.device("meta"):
+        model = model_cls(checkpoint["cfg"])
+    model.load_state_dict(checkpoint["state_dict"], assign=True)
+    # Non-persistent buffers are not in the state dict
+    model.encoder.pos_enc.reset_pe(model.encoder.pos_emb_max_len, torch.device("cpu"))
+    return model.eval()
+
+
 def load_model(
     model_name: str,
     fp16_encoder: bool = True,
     use_flash: Optional[bool] = False,
     device: Optional[Union[str, torch.device]] = None,
     download_root: Optional[str] = None,
+    quantize: Optional[str] = None,
+    quantize_joint: bool = False,
+    bf16_cpu: bool = False,
+    use_cache: bool = True,
 ) -> Union[GigaAM, GigaAMEmo, GigaAMASR]:
     """
     Load the GigaAM model by name.
@@ -103,6 +129,20 @@ def load_model(
         The device to load the model onto. Defaults to "cuda" if available, otherwise "cpu".
     download_root : Optional[str]
         The directory to download the model to. Defaults to "~/.cache/gigaam".
+    quantize : Optional[str]
+        Quantization mode for CPU inference: "int8" applies dynamic quantization
+        to the encoder `nn.Linear` layers. The quantized weights are cached
+        next to the checkpoint. Default to None (no quantization).
+    quantize_joint : bool
+        Whether to also quantize the RNN-T joint when `quantize` is set.
+    bf16_cpu : bool
+        Whether to run the encoder and the head under bfloat16 autocast on CPU.
+        Enabled only if the CPU has native bf16 support (AVX512-BF16 / AMX).
+        Default to False.
+    use_cache : bool
+        Whether to cache the final (fp16 / quantized) weights next to the checkpoint
+        and load them memory-mapped on subsequent calls. Quantized weights are
+        always cached. Default to True.
     """
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -112,10 +152,36 @@ def load_model(
     if download_root is None:
         download_root = _CACHE_DIR
 
+    if quantize is not None:
+        if quantize not in QUANTIZATION_MODES:
+            raise ValueError(
+                f"Unknown quantization '{quantize}'. Available: {QUANTIZATION_MODES}"
+            )
+        if device.type != "cpu":
+            raise ValueError(f"{quantize} quantization is supported only on CPU")
+        if bf16_cpu:
+            raise ValueError("bf16_cpu can't be combined with quantization")
+
     model_name, model_path = _download_model(model_name, download_root)
     tokenizer_path = _download_tokenizer(model_name, download_root)
 
-    checkpoint = torch.load(model_path, map_location="cpu")
+    half_encoder = fp16_encoder and device.type != "cpu" and quantize is None
+    converted_path = None
+    if use_cache or quantize is not None:
+        converted_path = _converted_path(
+            download_root, model_name, quantize, quantize_joint, half_encoder
+        )
+    from_converted = converted_path is not None and os.path.exists(converted_path)
+
+    if from_converted:
+        checkpoint = torch.load(
+            converted_path, map_location="cpu", mmap=True, weights_only=False
+        )
+        # Converted weights are regenerated when the source checkpoint has changed
+        if checkpoint.get("source") != _source_stamp(model_path):
+            from_converted = False
+    if not from_converted:
+        checkpoint = torch.load(model_path, map_location="cpu")
 
     if use_flash is not None:
         checkpoint["cfg"].encoder.flash_attn = use_flash
@@ -127,19 +193,44 @@ def load_model(
         checkpoint["cfg"].decoding.model_path = tokenizer_path
 
     if "ssl" in model_name:
-        model = GigaAM(checkpoint["cfg"])
+        model_cls: Type[GigaAM] = GigaAM
     elif "emo" in model_name:
-        model = GigaAMEmo(checkpoint["cfg"])
+        model_cls = GigaAMEmo
     else:
-        model = GigaAMASR(checkpoint["cfg"])
-
-    model.load_state_dict(checkpoint["state_dict"], strict=False)
-    model = model.eval()
+        model_cls = GigaAMASR
 
-    if fp16_encoder and device.type != "cpu":
-        model.encoder = model.encoder.half()
-    elif fp16_encoder:
+    if from_converted:
+        model = _load_converted(model_cls, checkpoint, quantize, quantize_joint)
+    else:
+        model = model_cls(checkpoint["cfg"])
+        model.load_state_dict(checkpoint["state_dict"], strict=False)
+        model = model.eval()
+        if quantize is not None:
+            quantize_int8(model, quantize_joint)
+        if half_encoder:
+            model.encoder = model.encoder.half()
+        if converted_path is not None:
+            # Per-process temporary file: worker processes may convert concurrently
+            tmp_path = f"{converted_path}.{os.getpid()}.tmp"
+            torch.save(
+                {
+                    "cfg": checkpoint["cfg"],
+                    "state_dict": model.state_dict(),
+                    "source": _source_stamp(model_path),
+                },
+                tmp_path,
+            )
+            os.replace(tmp_path, converted_path)
+
+    if fp16_encoder and device.type == "cpu" and quantize is None and not bf16_cpu:
         logging.warning("fp16 is not supported on CPU. Leaving fp32 weights...")
 
+    if bf16_cpu and device.type == "cpu":
+        if cpu_supports_bf16():
+            model.cpu_autocast_dtype = torch.bfloat16
+        else:
+            logging.warning("CPU has no native bf16 support. Leaving fp32 inference...")
+
     checkpoint["cfg"].model_name = model_name
+    model.checkpoint_path = model_path
     return model.to(device)
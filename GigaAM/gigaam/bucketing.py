@@ -0,0 +1,130 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import torch
+from torch import Tensor, nn
+
+# Segment lengths (seconds) the encoder is specialized for; `segment_audio`
+# produces chunks of up to 22 s and `transcribe` accepts up to 25 s
+DEFAULT_BUCKETS_SEC = (4.0, 8.0, 12.0, 16.0, 20.0, 25.0)
+# Batch sizes the encoder is specialized for (`transcribe_batch`, emotion batches
+# and their last partial batches are padded up to the nearest one)
+DEFAULT_BATCH_BUCKETS = (1, 2, 4, 8, 16)
+COMPILE_MODES = ["compile", "script"]
+
+
+class _PaddedEncoder(nn.Module):
+    """
+    Encoder on inputs padded to a bucket: padded frames are always masked in attention.
+    """
+
+    def __init__(self, encoder: nn.Module):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, features: Tensor, lengths: Tensor) -> Tuple[Tensor, Tensor]:
+        return self.encoder(features, lengths, force_att_mask=True)
+
+
+class BucketedEncoder:
+    """
+    Runs the encoder on features padded to one of a few fixed lengths and batch sizes,
+    so that a `torch.compile`d or TorchScript-traced encoder is specialized once per
+    (batch, length) bucket instead of once per input shape. Padded frames are excluded
+    from attention via the encoder padding mask, so results match the eager encoder
+    within tolerance. Inputs longer or larger than the largest bucket run eagerly.
+    """
+
+    def __init__(
+        self,
+        encoder: nn.Module,
+        buckets: Sequence[int],
+        mode: str = "compile",
+        batch_buckets: Sequence[int] = DEFAULT_BATCH_BUCKETS,
+    ):
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode '{mode}'. Available: {COMPILE_MODES}")
+        self.encoder = encoder
+        self.buckets: List[int] = sorted(buckets)
+        self.batch_buckets: List[int] = sorted(batch_buckets)
+        self.mode = mode
+
+        self._padded = _PaddedEncoder(encoder)
+        self._compiled: Optional[Callable] = None
+        self._traced: Dict[Tuple[int, int], torch.jit.ScriptModule] = {}
+        # Shapes already compiled or traced; the first call per shape runs under the lock
+        self._ready: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+        if mode == "compile":
+            # One graph per (batch, length) bucket must fit into the dynamo
+            # recompilation cache, otherwise dynamo silently falls back to eager
+            dynamo_config = torch._dynamo.config
+            dynamo_config.cache_size_limit = max(
+                dynamo_config.cache_size_limit,
+                len(self.buckets) * len(self.batch_buckets) + 1,
+            )
+            self._compiled = torch.compile(self._padded, dynamic=False)
+
+    @staticmethod
+    def _smallest_fitting(buckets: Sequence[int], size: int) -> Optional[int]:
+        for bucket in buckets:
+            if size <= bucket:
+                return bucket
+        return None
+
+    def bucket_for(self, num_frames: int) -> Optional[int]:
+        """
+        Returns the smallest bucket fitting `num_frames`, or None if there is none.
+        """
+        return self._smallest_fitting(self.buckets, num_frames)
+
+    def batch_bucket_for(self, batch_size: int) -> Optional[int]:
+        """
+        Returns the smallest batch bucket fitting `batch_size`, or None if there is none.
+        """
+        return self._smallest_fitting(self.batch_buckets, batch_size)
+
+    def _runner(self, shape: Tuple[int, int], features: Tensor) -> Callable:
+        if self._compiled is not None:
+            return self._compiled
+        if shape not in self._traced:
+            example = (
+                torch.zeros_like(features),
+                torch.full([shape[0]], shape[1], device=features.device),
+            )
+            self._traced[shape] = torch.jit.trace(self._padded, example, check_trace=False)
+        return self._traced[shape]
+
+    def _run(self, shape: Tuple[int, int], features: Tensor, lengths: Tensor):
+        if shape in self._ready:
+            return self._runner(shape, features)(features, lengths)
+        with self._lock:
+            if shape not in self._ready:
+                logging.info(
+                    "Specializing %s encoder for batch %d x %d frames (%d/%d shapes)",
+                    self.mode,
+                    shape[0],
+                    shape[1],
+                    len(self._ready) + 1,
+                    len(self.buckets) * len(self.batch_buckets),
+                )
+            result = self._runner(shape, features)(features, lengths)
+            self._ready.add(shape)
+        return result
+
+    def __call__(self, features: Tensor, lengths: Tensor) -> Tuple[Tensor, Tensor]:
+        batch_size, num_frames = features.shape[0], features.shape[-1]
+        bucket = self.bucket_for(num_frames)
+        batch_bucket = self.batch_bucket_for(batch_size)
+        if bucket is None or batch_bucket is None:
+            return self.encoder(features, lengths)
+
+        features = nn.functional.pad(features, (0, bucket - num_frames))
+        if batch_bucket > batch_size:
+            # Padding rows are full-length silence and are dropped from the outputs
+            features = nn.functional.pad(features, (0, 0, 0, 0, 0, batch_bucket - batch_size))
+            lengths = nn.functional.pad(lengths, (0, batch_bucket - batch_size), value=bucket)
+        encoded, encoded_len = self._run((batch_bucket, bucket), features, lengths)
+        encoded, encoded_len = encoded[:batch_size], encoded_len[:batch_size]
+        return encoded[..., : int(encoded_len.max())], encoded_len
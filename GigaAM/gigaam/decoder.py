@@ -17,7 +17,7 @@ class CTCHead(nn.Module):
 
     def forward(self, encoder_output: Tensor) -> Tensor:
         return torch.nn.functional.log_softmax(
-            self.decoder_layers(encoder_output).transpose(1, 2), dim=-1
+            self.decoder_layers(encoder_output).transpose(1, 2).float(), dim=-1
         )
 
 
@@ -44,7 +44,7 @@ class RNNTJoint(nn.Module):
         """
         enc = self.enc(encoder_out).unsqueeze(2)
         pred = self.pred(decoder_out).unsqueeze(1)
-        return self.joint_net(enc + pred).log_softmax(-1)
+        return self.joint_net(enc + pred).float().log_softmax(-1)
 
     def input_example(self):
         device = next(self.parameters()).device
@@ -126,3 +126,68 @@ class RNNTHead(nn.Module):
         super().__init__()
         self.decoder = RNNTDecoder(**decoder)
         self.joint = RNNTJoint(**joint)
+
+
+class RNNTEncoderProjection(nn.Module):
+    """
+    Encoder followed by the encoder side of the RNN-T joint.
+    Used for ONNX export, so that the projection is computed once for the whole sequence.
+    """
+
+    def __init__(self, encoder: nn.Module, joint: RNNTJoint):
+        super().__init__()
+        self.encoder = encoder
+        self.joint = joint
+
+    def input_example(self):
+        return self.encoder.input_example()
+
+    def input_names(self):
+        return self.encoder.input_names()
+
+    def output_names(self):
+        return ["enc_proj", "encoded_len"]
+
+    def dynamic_axes(self):
+        axes = self.encoder.dynamic_axes()
+        return {
+            "audio_signal": axes["audio_signal"],
+            "length": axes["length"],
+            "enc_proj": {0: "batch_size", 1: "seq_len"},
+            "encoded_len": axes["encoded_len"],
+        }
+
+    def forward(self, audio_signal: Tensor, length: Tensor) -> Tuple[Tensor, Tensor]:
+        encoded, encoded_len = self.encoder(audio_signal, length)
+        return self.joint.enc(encoded.transpose(1, 2)), encoded_len
+
+
+class RNNTDecoderJoint(nn.Module):
+    """
+    Prediction network and joint fused into a single greedy decoding step.
+    Takes an encoder frame already projected by `RNNTEncoderProjection`
+    and returns the best token together with the updated LSTM state.
+    """
+
+    def __init__(self, head: RNNTHead):
+        super().__init__()
+        self.decoder = head.decoder
+        self.joint = head.joint
+
+    def input_example(self):
+        label, hidden_h, hidden_c = self.decoder.input_example()
+        enc = torch.zeros(1, self.joint.enc.out_features).to(label.device)
+        return enc, label, hidden_h, hidden_c
+
+    def input_names(self):
+        return ["enc", "x", "h", "c"]
+
+    def output_names(self):
+        return ["token", "h_out", "c_out"]
+
+    def forward(
+        self, enc: Tensor, x: Tensor, h: Tensor, c: Tensor
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        g, h, c = self.decoder(x, h, c)
+        logits = self.joint.joint_net(enc.unsqueeze(1) + self.joint.pred(g))
+        return logits.argmax(-1), h, c
@@ -1,10 +1,10 @@
 from typing import List, Optional
 
 import torch
-from sentencepiece import SentencePieceProcessor
 from torch import Tensor
 
 from .decoder import CTCHead, RNNTHead
+from .utils import profile_range
 
 
 class Tokenizer:
@@ -18,6 +18,8 @@ class Tokenizer:
         if self.charwise:
             self.vocab = vocab
         else:
+            from sentencepiece import SentencePieceProcessor
+
             self.model = SentencePieceProcessor()
             self.model.load(model_path)
 
@@ -50,7 +52,8 @@ class CTCGreedyDecoding:
         """
         Decode the output of a CTC model into a list of hypotheses.
         """
-        log_probs = head(encoder_output=encoded)
+        with profile_range("ctc_decoding"):
+            log_probs = head(encoder_output=encoded)
         assert (
             len(log_probs.shape) == 3
         ), f"Expected log_probs shape {log_probs.shape} == [B, T, C]"
@@ -64,8 +67,8 @@ class CTCGreedyDecoding:
         skip_mask[:, 1:] = torch.logical_and(
             skip_mask[:, 1:], labels[:, 1:] != labels[:, :-1]
         )
-        for length in lengths:
-            skip_mask[length:] = 0
+        for i, length in enumerate(lengths):
+            skip_mask[i, length:] = 0
 
         pred_texts: List[str] = []
         for i in range(b):
@@ -123,5 +126,6 @@ class RNNTGreedyDecoding:
         encoded = encoded.transpose(1, 2)
         for i in range(b):
             inseq = encoded[i, :, :].unsqueeze(1)
-            pred_texts.append(self._greedy_decode(head, inseq, enc_len[i]))
+            with profile_range("rnnt_decoding"):
+                pred_texts.append(self._greedy_decode(head, inseq, enc_len[i]))
         return pred_texts
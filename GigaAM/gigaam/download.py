@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from .utils import file_sha256
+
+# Known file hashes, kept in the download directory
+SHA256_MANIFEST = "sha256.json"
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 16 << 20
+
+
+def _write_json(path: str, data: Dict) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _probe(file_url: str) -> Tuple[int, bool]:
+    """
+    Returns the file size (0 if unknown) and whether the server accepts range requests.
+    """
+    request = urllib.request.Request(file_url, method="HEAD")
+    with urllib.request.urlopen(request) as response:
+        size = int(response.headers.get("Content-Length", 0))
+        ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return size, ranges and size > 0
+
+
+def _download_range(
+    file_url: str, part_path: str, start: int, end: int, loop: tqdm
+) -> None:
+    """
+    Downloads bytes [start, end] into the preallocated partial file.
+    """
+    request = urllib.request.Request(file_url, headers={"Range": f"bytes={start}-{end}"})
+    with urllib.request.urlopen(request) as source, open(part_path, "r+b") as output:
+        if source.status != 206:
+            raise RuntimeError(f"Server ignored range request for {file_url}")
+        output.seek(start)
+        while True:
+            buffer = source.read(1 << 20)
+            if not buffer:
+                break
+            output.write(buffer)
+            loop.update(len(buffer))
+        if output.tell() != end + 1:
+            raise RuntimeError(f"Incomplete range {start}-{end} of {file_url}")
+
+
+def _download_parallel(
+    file_url: str, part_path: str, size: int, num_workers: int, chunk_size: int
+) -> None:
+    """
+    Fetches the file in `chunk_size` ranges with `num_workers` connections.
+    Completed chunks are recorded in a progress file, so an interrupted
+    download resumes with the missing chunks only.
+    """
+    progress_path = part_path + ".json"
+    progress = _read_json(progress_path)
+    if (
+        progress.get("url") != file_url
+        or progress.get("size") != size
+        or progress.get("chunk_size") != chunk_size
+        or not os.path.exists(part_path)
+    ):
+        progress = {"url": file_url, "size": size, "chunk_size": chunk_size, "done": []}
+        with open(part_path, "wb") as output:
+            output.truncate(size)
+
+    chunks: List[Tuple[int, int]] = [
+        (start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)
+    ]
+    done = set(progress["done"])
+    pending = [(i, chunk) for i, chunk in enumerate(chunks) if i not in done]
+    lock = threading.Lock()
+
+    with tqdm(
+        total=size,
+        initial=size - sum(end - start + 1 for _, (start, end) in pending),
+        ncols=80,
+        unit="iB",
+        unit_scale=True,
+        unit_divisor=1024,
+    ) as loop:
+
+        def fetch(item: Tuple[int, Tuple[int, int]]) -> None:
+            index, (start, end) = item
+            _download_range(file_url, part_path, start, end, loop)
+            with lock:
+                done.add(index)
+                progress["done"] = sorted(done)
+                _write_json(progress_path, progress)
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # list() re-raises the first failed chunk
+            list(executor.map(fetch, pending))
+
+    os.remove(progress_path)
+
+
+def _download_stream(file_url: str, part_path: str) -> None:
+    """
+    Single-connection fallback for servers without range support.
+    """
+    with urllib.request.urlopen(file_url) as source, open(part_path, "wb") as output:
+        with tqdm(
+            total=int(source.info().get("Content-Length", 0)),
+            ncols=80,
+            unit="iB",
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as loop:
+            while True:
+                buffer = source.read(1 << 20)
+                if not buffer:
+                    break
+                output.write(buffer)
+                loop.update(len(buffer))
+
+
+def download_file(
+    file_url: str,
+    file_path: str,
+    num_workers: int = DOWNLOAD_WORKERS,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    expected_sha256: Optional[str] = None,
+) -> str:
+    """
+    Downloads a file if not already cached.
+    The file is fetched into `<file_path>.part` with parallel range requests
+    (resuming an interrupted download), verified against `expected_sha256` or the
+    hash recorded in the `sha256.json` manifest of the target directory, and only
+    then atomically renamed to `file_path`. Hashes of new files are recorded
+    in the manifest.
+    """
+    if os.path.exists(file_path):
+        return file_path
+
+    download_dir = os.path.dirname(file_path)
+    os.makedirs(download_dir, exist_ok=True)
+    manifest_path = os.path.join(download_dir, SHA256_MANIFEST)
+    file_name = os.path.basename(file_path)
+    if expected_sha256 is None:
+        expected_sha256 = _read_json(manifest_path).get(file_name)
+
+    part_path = file_path + ".part"
+    size, ranges = _probe(file_url)
+    if ranges:
+        _download_parallel(file_url, part_path, size, num_workers, chunk_size)
+    else:
+        _download_stream(file_url, part_path)
+
+    sha256 = file_sha256(part_path)
+    if expected_sha256 is not None and sha256 != expected_sha256:
+        os.remove(part_path)
+        raise RuntimeError(
+            f"SHA256 mismatch for {file_name}: expected {expected_sha256}, got {sha256}"
+        )
+    os.replace(part_path, file_path)
+
+    manifest = _read_json(manifest_path)
+    if manifest.get(file_name) != sha256:
+        manifest[file_name] = sha256
+        _write_json(manifest_path, manifest)
+    return file_path
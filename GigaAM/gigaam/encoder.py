@@ -13,7 +13,7 @@ except Exception as err:
     IMPORT_FLASH = False
     IMPORT_FLASH_ERR = err
 
-from .utils import apply_masked_flash_attn, apply_rotary_pos_emb
+from .utils import apply_masked_flash_attn, apply_rotary_pos_emb, profile_range
 
 
 class StridingSubsampling(nn.Module):
@@ -49,7 +49,7 @@ class StridingSubsampling(nn.Module):
             layers.append(nn.ReLU())
             in_channels = conv_channels
 
-        out_length = self.calc_output_length(torch.tensor(feat_in))
+        out_length = self.calc_output_length(torch.tensor(feat_in, device="cpu"))
         self.out = torch.nn.Linear(conv_channels * int(out_length), feat_out)
         self.conv = torch.nn.Sequential(*layers)
 
@@ -109,19 +109,29 @@ class MultiHeadAttention(nn.Module, ABC):
         return q.transpose(1, 2), k.transpose(1, 2), v.transpose(1, 2)
 
     def forward_attention(
-        self, value: Tensor, scores: Tensor, mask: Optional[Tensor]
+        self,
+        query: Tensor,
+        key: Tensor,
+        value: Tensor,
+        mask: Optional[Tensor],
+        attn_bias: Optional[Tensor] = None,
     ) -> Tensor:
         """
-        Computes the scaled dot-product attention given the projected values and scores.
+        Computes the scaled dot-product attention of projected [B, H, T, d_k] inputs
+        with `scaled_dot_product_attention`. `mask` is a broadcastable [B, 1, 1, T]
+        key padding mask (True for padded frames), `attn_bias` is an optional additive
+        [B, H, T_q, T] score bias, both applied without materializing a B x T x T mask.
         """
         b = value.size(0)
+        attn_mask = attn_bias
         if mask is not None:
-            mask = mask.unsqueeze(1)
-            scores = scores.masked_fill(mask, -10000.0)
-            attn = torch.softmax(scores, dim=-1).masked_fill(mask, 0.0)
-        else:
-            attn = torch.softmax(scores, dim=-1)
-        x = torch.matmul(attn, value)
+            if attn_mask is None:
+                attn_mask = ~mask
+            else:
+                attn_mask = attn_mask.masked_fill(mask, -10000.0)
+        x = nn.functional.scaled_dot_product_attention(
+            query, key, value, attn_mask=attn_mask
+        )
         x = x.transpose(1, 2).reshape(b, -1, self.h * self.d_k)
         return self.linear_out(x)
 
@@ -129,8 +139,13 @@ class MultiHeadAttention(nn.Module, ABC):
 class RelPositionMultiHeadAttention(MultiHeadAttention):
     """
     Relative Position Multi-Head Attention module.
+    The positional scores are an explicit [B, H, T, T] bias, so attention runs on the
+    math kernel; queries are processed in chunks of `att_chunk_size` frames to keep
+    the bias at [B, H, att_chunk_size, T] instead of quadratic in the sequence length.
     """
 
+    att_chunk_size = 256
+
     def __init__(self, n_head: int, n_feat: int):
         super().__init__(n_head, n_feat)
         self.linear_pos = nn.Linear(n_feat, n_feat, bias=False)
@@ -157,12 +172,42 @@ class RelPositionMultiHeadAttention(MultiHeadAttention):
         p = p.view(pos_emb.shape[0], -1, self.h, self.d_k).transpose(1, 2)
         q_with_bias_u = (q + self.pos_bias_u).transpose(1, 2)
         q_with_bias_v = (q + self.pos_bias_v).transpose(1, 2)
+
+        t = k.size(-2)
+        if t <= self.att_chunk_size:
+            return self._attend(q_with_bias_u, q_with_bias_v, p, k, v, mask)
+        outputs = []
+        for start in range(0, t, self.att_chunk_size):
+            end = min(start + self.att_chunk_size, t)
+            # Query rows [start, end) only see the relative positions in
+            # p[t - end : 2t - 1 - start]; rel_shift over this window yields
+            # the same rows as the shift of the full score matrix
+            outputs.append(
+                self._attend(
+                    q_with_bias_u[:, :, start:end],
+                    q_with_bias_v[:, :, start:end],
+                    p[:, :, t - end : 2 * t - 1 - start],
+                    k,
+                    v,
+                    mask,
+                )
+            )
+        return torch.cat(outputs, dim=1)
+
+    def _attend(
+        self,
+        q_with_bias_u: Tensor,
+        q_with_bias_v: Tensor,
+        p: Tensor,
+        k: Tensor,
+        v: Tensor,
+        mask: Optional[Tensor],
+    ) -> Tensor:
         matrix_bd = torch.matmul(q_with_bias_v, p.transpose(-2, -1))
         matrix_bd = self.rel_shift(matrix_bd)
-        matrix_ac = torch.matmul(q_with_bias_u, k.transpose(-2, -1))
-        matrix_bd = matrix_bd[:, :, :, : matrix_ac.size(-1)]
-        scores = (matrix_ac + matrix_bd) / math.sqrt(self.d_k)
-        return self.forward_attention(v, scores, mask)
+        matrix_bd = matrix_bd[:, :, :, : k.size(-2)] / math.sqrt(self.d_k)
+        # Content scores (matrix_ac) are computed inside scaled_dot_product_attention
+        return self.forward_attention(q_with_bias_u, k, v, mask, attn_bias=matrix_bd)
 
 
 class RotaryPositionMultiHeadAttention(MultiHeadAttention):
@@ -193,8 +238,7 @@ class RotaryPositionMultiHeadAttention(MultiHeadAttention):
         )
 
         if not self.flash_attn:
-            scores = torch.matmul(q, k.transpose(-2, -1) / math.sqrt(self.d_k))
-            out = self.forward_attention(v, scores, mask)
+            out = self.forward_attention(q, k, v, mask)
         else:
             if mask is None:
                 scores = flash_attn_func(q, k, v)
@@ -233,6 +277,14 @@ class PositionalEncoding(nn.Module, ABC):
         else:
             self.register_buffer("pe", pe, persistent=False)
 
+    def reset_pe(self, length: int, device: torch.device):
+        """
+        Recreates the positional encoding buffer, e.g. for a module built on the meta device.
+        """
+        if hasattr(self, "pe"):
+            del self.pe
+        self.extend_pe(length, device)
+
 
 class RelPositionalEmbedding(PositionalEncoding):
     """
@@ -470,6 +522,7 @@ class ConformerEncoder(nn.Module):
             )
             self.layers.append(layer)
 
+        self.pos_emb_max_len = pos_emb_max_len
         self.pos_enc.extend_pe(pos_emb_max_len, next(self.parameters()).device)
 
     def input_example(
@@ -496,7 +549,13 @@ class ConformerEncoder(nn.Module):
             "encoded_len": {0: "batch_size"},
         }
 
-    def forward(self, audio_signal: Tensor, length: Tensor) -> Tuple[Tensor, Tensor]:
+    def forward(
+        self, audio_signal: Tensor, length: Tensor, force_att_mask: bool = False
+    ) -> Tuple[Tensor, Tensor]:
+        """
+        `force_att_mask` masks padded frames in attention even for a single
+        sequence (used for inputs padded to a fixed length).
+        """
         audio_signal, length = self.pre_encode(
             x=audio_signal.transpose(1, 2), lengths=length
         )
@@ -509,19 +568,19 @@ class ConformerEncoder(nn.Module):
         ) < length.unsqueeze(-1)
 
         att_mask = None
-        if audio_signal.shape[0] > 1:
-            att_mask = pad_mask.unsqueeze(1).repeat([1, max_len, 1])
-            att_mask = torch.logical_and(att_mask, att_mask.transpose(1, 2))
-            att_mask = ~att_mask
+        if audio_signal.shape[0] > 1 or force_att_mask:
+            # Key padding mask [B, 1, 1, T], broadcast over heads and queries
+            att_mask = ~pad_mask[:, None, None, :]
 
         pad_mask = ~pad_mask
 
-        for layer in self.layers:
-            audio_signal = layer(
-                x=audio_signal,
-                pos_emb=pos_emb,
-                att_mask=att_mask,
-                pad_mask=pad_mask,
-            )
+        for i, layer in enumerate(self.layers):
+            with profile_range(f"conformer_layer_{i}"):
+                audio_signal = layer(
+                    x=audio_signal,
+                    pos_emb=pos_emb,
+                    att_mask=att_mask,
+                    pad_mask=pad_mask,
+                )
 
         return audio_signal.transpose(1, 2), length
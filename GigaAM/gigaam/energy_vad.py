@@ -0,0 +1,127 @@
+from typing import List, Tuple
+
+import torch
+from torch import Tensor
+
+
+def _frame_features(
+    wav: Tensor, sample_rate: int, frame_len: int, hop_len: int, block_frames: int
+) -> Tuple[Tensor, Tensor, Tensor]:
+    """
+    Per-frame log energy (dB), spectral flatness and the share of energy in the
+    speech band (300-4000 Hz), computed over blocks of `block_frames` frames.
+    """
+    window = torch.hann_window(frame_len)
+    freqs = torch.fft.rfftfreq(frame_len, 1 / sample_rate)
+    speech_band = (freqs >= 300) & (freqs <= 4000)
+    frames = wav.unfold(0, frame_len, hop_len)
+
+    energy, flatness, band_ratio = [], [], []
+    for first in range(0, frames.shape[0], block_frames):
+        block = frames[first : first + block_frames]
+        block = block - block.mean(dim=1, keepdim=True)
+        power = torch.fft.rfft(block * window).abs().pow(2) + 1e-10
+        total = power.sum(dim=1)
+        energy.append(10 * torch.log10(block.pow(2).mean(dim=1) + 1e-10))
+        flatness.append(torch.exp(power.log().mean(dim=1)) / power.mean(dim=1))
+        band_ratio.append(power[:, speech_band].sum(dim=1) / total)
+    return torch.cat(energy), torch.cat(flatness), torch.cat(band_ratio)
+
+
+def _runs(mask: Tensor) -> List[Tuple[int, int]]:
+    """
+    [start, end) frame ranges of consecutive True values.
+    """
+    edge = torch.zeros(1, dtype=torch.int8)
+    padded = torch.cat([edge, mask.to(torch.int8), edge])
+    changes = torch.nonzero(padded[1:] - padded[:-1]).flatten().tolist()
+    return list(zip(changes[0::2], changes[1::2]))
+
+
+@torch.inference_mode()
+def energy_vad(
+    wav: Tensor,
+    sample_rate: int,
+    frame_ms: float = 25.0,
+    hop_ms: float = 10.0,
+    energy_margin_db: float = 12.0,
+    min_energy_db: float = -55.0,
+    max_flatness: float = 0.45,
+    min_band_ratio: float = 0.5,
+    hangover_ms: float = 300.0,
+    min_speech_ms: float = 150.0,
+    block_frames: int = 6000,
+) -> List[Tuple[float, float]]:
+    """
+    Lightweight voice activity detection on a float waveform.
+    A frame is speech if its energy exceeds the estimated noise floor by
+    `energy_margin_db` (and the absolute `min_energy_db`), and its spectrum is
+    not noise-like (flatness) with most energy in the speech band.
+    Pauses shorter than `hangover_ms` are bridged and speech shorter than
+    `min_speech_ms` is dropped. Returns speech regions in seconds.
+    """
+    frame_len = int(sample_rate * frame_ms / 1000)
+    hop_len = int(sample_rate * hop_ms / 1000)
+    if wav.shape[-1] < frame_len:
+        return []
+
+    energy, flatness, band_ratio = _frame_features(
+        wav.float(), sample_rate, frame_len, hop_len, block_frames
+    )
+    # Noise floor: energy of the quietest frames
+    noise_floor = torch.quantile(energy[:: max(1, energy.shape[0] // 100000)], 0.1)
+    threshold = max(float(noise_floor) + energy_margin_db, min_energy_db)
+    speech = (energy > threshold) & (flatness < max_flatness) & (band_ratio > min_band_ratio)
+
+    hangover = int(hangover_ms / hop_ms)
+    min_speech = int(min_speech_ms / hop_ms)
+    regions: List[List[int]] = []
+    for start, end in _runs(speech):
+        if regions and start - regions[-1][1] <= hangover:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    hop_sec = hop_len / sample_rate
+    duration = wav.shape[-1] / sample_rate
+    return [
+        (start * hop_sec, min(duration, (end - 1) * hop_sec + frame_len / sample_rate))
+        for start, end in regions
+        if end - start >= min_speech
+    ]
+
+
+def split_at_pauses(
+    wav: Tensor,
+    sample_rate: int,
+    max_duration: float,
+    hop_ms: float = 10.0,
+    smooth_ms: float = 100.0,
+) -> List[Tuple[int, int]]:
+    """
+    Splits a waveform into pieces no longer than `max_duration` seconds, cutting each
+    piece at the quietest point (smoothed frame energy) of its second half.
+    Returns [start, end) sample ranges covering the whole waveform.
+    """
+    max_len = int(max_duration * sample_rate)
+    length = wav.shape[-1]
+    if length <= max_len:
+        return [(0, length)]
+
+    hop_len = int(sample_rate * hop_ms / 1000)
+    kernel = 2 * int(smooth_ms / hop_ms / 2) + 1
+    energy = wav[: length // hop_len * hop_len].float().view(-1, hop_len).pow(2).mean(dim=1)
+    energy = torch.nn.functional.avg_pool1d(
+        energy[None, None], kernel, stride=1, padding=kernel // 2, count_include_pad=False
+    )[0, 0]
+
+    pieces = []
+    start = 0
+    while length - start > max_len:
+        first = (start + max_len // 2) // hop_len
+        last = (start + max_len) // hop_len
+        cut = (first + int(torch.argmin(energy[first:last]))) * hop_len
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, length))
+    return pieces
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Optional
+
+from .utils import file_sha256
+
+SEGMENTATION_FILE = "segmentation.json"
+RESULTS_FILE = "results.jsonl"
+
+# One job directory is used by one call at a time
+_JOB_LOCKS: Dict[str, threading.Lock] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def job_id(wav_file: str, options: Dict) -> str:
+    """
+    Identifies a long-form job by the audio content and the options that
+    affect segmentation and transcripts, so a retried upload of the same
+    file resumes the same job.
+    """
+    digest = hashlib.sha256(file_sha256(wav_file).encode())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class LongformJob:
+    """
+    Checkpoint of a `transcribe_longform` call in `<root>/<job id>`:
+    the segmentation is saved once, and every transcribed segment is appended
+    to a JSON lines file (flushed and fsynced), so an interrupted job resumes
+    after the last completed segment.
+    """
+
+    def __init__(self, root: str, wav_file: str, options: Dict):
+        self.path = os.path.join(root, job_id(wav_file, options))
+        with _REGISTRY_LOCK:
+            self._lock = _JOB_LOCKS.setdefault(self.path, threading.Lock())
+        self._results = None
+
+    def __enter__(self) -> "LongformJob":
+        self._lock.acquire()
+        os.makedirs(self.path, exist_ok=True)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._results is not None:
+            self._results.close()
+            self._results = None
+        self._lock.release()
+
+    def load_segmentation(self) -> Optional[Dict]:
+        path = os.path.join(self.path, SEGMENTATION_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_segmentation(self, segmentation: Dict) -> None:
+        path = os.path.join(self.path, SEGMENTATION_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(segmentation, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_results(self) -> Dict[int, Dict]:
+        """
+        Completed segments by index. A line cut short by a crash is truncated,
+        so that new results are appended after the last complete one.
+        """
+        path = os.path.join(self.path, RESULTS_FILE)
+        results: Dict[int, Dict] = {}
+        if not os.path.exists(path):
+            return results
+        valid_size = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("Incomplete line")
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                results[record.pop("index")] = record
+                valid_size += len(line)
+        if valid_size != os.path.getsize(path):
+            os.truncate(path, valid_size)
+        return results
+
+    def append_result(self, index: int, result: Dict) -> None:
+        if self._results is None:
+            path = os.path.join(self.path, RESULTS_FILE)
+            self._results = open(path, "a", encoding="utf-8")
+        self._results.write(json.dumps(dict(result, index=index), ensure_ascii=False) + "\n")
+        self._results.flush()
+        os.fsync(self._results.fileno())
+
+    def remove(self) -> None:
+        """
+        Deletes the checkpoint once the job has completed.
+        """
+        if self._results is not None:
+            self._results.close()
+            self._results = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
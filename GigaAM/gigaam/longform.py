@@ -0,0 +1,399 @@
+import contextlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import torch
+from tqdm import tqdm
+
+from .jobs import LongformJob
+from .preprocess import SAMPLE_RATE, load_audio
+
+# Segments transcribed by parallel backends between job checkpoints and cancellation checks
+_CHECKPOINT_BATCH = 32
+
+
+class TranscriptionCancelled(Exception):
+    """
+    Raised when the `cancel` event of a transcription is set.
+    """
+
+
+def _check_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise TranscriptionCancelled("Transcription cancelled")
+
+
+def _join_turn_pieces(utterances: List[Dict], turn_ids: List[int]) -> List[Dict]:
+    """
+    Reassembles pieces of a long speaker turn, split to bound the segment length,
+    into one utterance; emotion probabilities are averaged weighted by duration.
+    """
+    joined: List[Dict] = []
+    joined_ids: List[int] = []
+    for utterance, turn_id in zip(utterances, turn_ids):
+        if not joined or joined_ids[-1] != turn_id:
+            joined.append(dict(utterance))
+            joined_ids.append(turn_id)
+            continue
+
+        turn = joined[-1]
+        start, prev_end = turn["boundaries"]
+        end = utterance["boundaries"][1]
+        turn["transcription"] = " ".join(
+            text for text in [turn["transcription"], utterance["transcription"]] if text
+        )
+        if "emotions" in turn:
+            prev_weight = prev_end - start
+            weight = end - prev_end
+            turn["emotions"] = {
+                name: (prob * prev_weight + utterance["emotions"][name] * weight)
+                / (prev_weight + weight)
+                for name, prob in turn["emotions"].items()
+            }
+        turn["boundaries"] = (start, end)
+    return joined
+
+
+def transcribe_longform(
+    model,
+    wav_file: str,
+    use_speaker_diarization: bool = False,
+    device: Union[str, torch.device] = "cpu",
+    precompute_features: bool = False,
+    vad: str = "pyannote",
+    pipeline_diarization: bool = False,
+    emo_model=None,
+    emo_batch_size: int = 8,
+    job_dir: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    **kwargs,
+) -> List[Dict[str, Union[str, Tuple[float, float], Dict[str, float]]]]:
+    """
+    Transcribes a long audio file by splitting it into segments with
+    VAD (or speaker diarization) and then transcribing each segment with
+    `model.transcribe_segment`, which maps a float waveform to text.
+    This lets every inference backend share the same long-form pipeline.
+    With `precompute_features`, Log-mel features of the whole recording are
+    computed once by `model.preprocessor.stream` and every segment is passed
+    to `model.transcribe_features` as a frame slice instead.
+    `vad` selects the VAD backend of `segment_audio` ("pyannote" or "energy"),
+    it is not used with speaker diarization unless `pipeline_diarization` is set.
+    With `pipeline_diarization`, speaker diarization runs in a background thread
+    while the VAD segments are transcribed, and every segment gets the speaker
+    that overlaps it the most. Segments are not split at speaker changes,
+    so a lower `min_duration` gives more accurate labels.
+    With `emo_model` (a `GigaAMEmo`), every utterance also gets the emotion
+    probabilities of its segment, computed in batches of `emo_batch_size`.
+    With speaker diarization, long turns are transcribed in pieces of at most
+    `max_duration` seconds and returned as one utterance.
+    With `job_dir`, the segmentation and every transcribed segment are checkpointed
+    to a job directory (see `LongformJob`) keyed by the audio content and options,
+    so a call interrupted by a crash resumes after the last completed segment.
+    The checkpoint is removed once the job completes.
+    Setting `cancel` stops the call with `TranscriptionCancelled` before the next
+    segment (a cancelled job keeps its checkpoint).
+    """
+    job = None
+    if job_dir is not None:
+        options = dict(
+            kwargs,
+            model=_model_tag(model),
+            use_speaker_diarization=use_speaker_diarization,
+            precompute_features=precompute_features,
+            vad=vad,
+            pipeline_diarization=pipeline_diarization,
+            emotions=emo_model is not None,
+        )
+        job = LongformJob(job_dir, wav_file, options)
+
+    with job if job is not None else contextlib.nullcontext():
+        utterances = _transcribe_longform(
+            model,
+            wav_file,
+            job,
+            use_speaker_diarization=use_speaker_diarization,
+            device=device,
+            precompute_features=precompute_features,
+            vad=vad,
+            pipeline_diarization=pipeline_diarization,
+            emo_model=emo_model,
+            emo_batch_size=emo_batch_size,
+            cancel=cancel,
+            **kwargs,
+        )
+        if job is not None:
+            job.remove()
+    return utterances
+
+
+def _model_tag(model) -> str:
+    """
+    Model name for job identification (checkpoint name, ONNX model type or class name).
+    """
+    cfg = getattr(model, "cfg", None)
+    name = cfg.get("model_name") if cfg is not None else None
+    return str(name or getattr(model, "model_type", None) or type(model).__name__)
+
+
+def _segment(
+    wav: torch.Tensor,
+    use_speaker_diarization: bool,
+    device: Union[str, torch.device],
+    vad: str,
+    pipeline_diarization: bool,
+    diarization_executor: ThreadPoolExecutor,
+    **kwargs,
+) -> Tuple[List[torch.Tensor], Dict, Optional[Future]]:
+    """
+    Splits the recording into segments. Returns the segments, their description
+    (boundaries, sample ranges, speakers, turn ids) and, in the pipelined mode,
+    the pending diarization.
+    """
+    from .vad_utils import pyannote_turns, segment_audio, segment_audio_by_speakers
+
+    speakers = None
+    turn_ids = None
+    diarization = None
+    if use_speaker_diarization and pipeline_diarization:
+        diarization = diarization_executor.submit(
+            pyannote_turns, wav, SAMPLE_RATE, device=device
+        )
+        segments, boundaries = segment_audio(
+            wav, SAMPLE_RATE, device=device, vad=vad, **kwargs
+        )
+    elif use_speaker_diarization:
+        # Same-speaker turns are merged up to the chunk length segment_audio uses
+        options = {"min_duration": 15.0, **kwargs}
+        segments, boundaries, speakers, turn_ids = segment_audio_by_speakers(
+            wav, SAMPLE_RATE, device=device, return_turn_ids=True, **options
+        )
+    else:
+        segments, boundaries = segment_audio(
+            wav, SAMPLE_RATE, device=device, vad=vad, **kwargs
+        )
+
+    segmentation = {
+        "boundaries": boundaries,
+        # Segments are views into one normalized waveform
+        "ranges": [
+            (segment.storage_offset(), segment.storage_offset() + segment.shape[-1])
+            for segment in segments
+        ],
+        "speakers": speakers,
+        "turn_ids": turn_ids,
+    }
+    return segments, segmentation, diarization
+
+
+def _transcribe_longform(
+    model,
+    wav_file: str,
+    job: Optional[LongformJob],
+    use_speaker_diarization: bool,
+    device: Union[str, torch.device],
+    precompute_features: bool,
+    vad: str,
+    pipeline_diarization: bool,
+    emo_model,
+    emo_batch_size: int,
+    cancel: Optional[threading.Event],
+    **kwargs,
+) -> List[Dict[str, Union[str, Tuple[float, float], Dict[str, float]]]]:
+    from .vad_utils import assign_speakers, boundary_to_samples
+
+    segmentation = job.load_segmentation() if job is not None else None
+    done = job.load_results() if job is not None else {}
+
+    wav = None
+    diarization = None
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        if segmentation is None:
+            wav = load_audio(wav_file, return_format="int")
+            segments, segmentation, diarization = _segment(
+                wav, use_speaker_diarization, device, vad, pipeline_diarization, executor, **kwargs
+            )
+            if job is not None:
+                job.save_segmentation(segmentation)
+            done = {}
+            pending = list(range(len(segments)))
+        else:
+            num_segments = len(segmentation["boundaries"])
+            pending = [i for i in range(num_segments) if i not in done]
+            resume_diarization = (
+                use_speaker_diarization and pipeline_diarization and "turns" not in segmentation
+            )
+            print(f"Resuming job: {num_segments - len(pending)}/{num_segments} segments done")
+            segments = [None] * num_segments
+            if pending or resume_diarization:
+                wav = load_audio(wav_file, return_format="int")
+                wav_float = wav.float() / 32768.0
+                segments = [wav_float[start:end] for start, end in segmentation["ranges"]]
+            if resume_diarization:
+                from .vad_utils import pyannote_turns
+
+                diarization = executor.submit(pyannote_turns, wav, SAMPLE_RATE, device=device)
+
+        boundaries = [tuple(boundary) for boundary in segmentation["boundaries"]]
+        _check_cancelled(cancel)
+
+        features = None
+        if precompute_features and pending:
+            features = model.preprocessor.stream(wav.float() / 32768.0)
+
+        emotions = None
+        if emo_model is not None and pending:
+            probs = emo_model.get_probs_batch(
+                [segments[i] for i in pending], batch_size=emo_batch_size
+            )
+            emotions = dict(zip(pending, probs))
+
+        results = dict(done)
+
+        def record(index: int, transcription: str) -> None:
+            result = {"transcription": transcription}
+            if emotions is not None:
+                result["emotions"] = emotions[index]
+            results[index] = result
+            if job is not None:
+                job.append_result(index, result)
+
+        if hasattr(model, "transcribe_segments"):
+            # Parallel backends (see `ShardedTranscriber`) take many segments at once;
+            # with a job or a cancel event, results are checkpointed after every batch
+            batch_size = (
+                len(pending) if job is None and cancel is None else _CHECKPOINT_BATCH
+            )
+            for first in range(0, len(pending), max(1, batch_size)):
+                _check_cancelled(cancel)
+                batch = pending[first : first + batch_size]
+                for index, transcription in zip(
+                    batch, model.transcribe_segments([segments[i] for i in batch])
+                ):
+                    record(index, transcription)
+        else:
+            for index in tqdm(pending):
+                _check_cancelled(cancel)
+                segment = segments[index]
+                if features is not None:
+                    start, _ = boundary_to_samples(*boundaries[index], SAMPLE_RATE)
+                    frames = model.preprocessor.frame_slice(start, segment.shape[-1])
+                    record(index, model.transcribe_features(features[:, frames]))
+                else:
+                    record(index, model.transcribe_segment(segment))
+
+        speakers = segmentation["speakers"]
+        if diarization is not None:
+            turns = diarization.result()
+            if job is not None:
+                job.save_segmentation(dict(segmentation, turns=turns))
+            speakers = assign_speakers(boundaries, turns)
+        elif "turns" in segmentation:
+            speakers = assign_speakers(boundaries, [tuple(turn) for turn in segmentation["turns"]])
+    finally:
+        # A failed or cancelled call does not wait for the background diarization
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    transcribed_segments = []
+    for i, segment_boundaries in enumerate(boundaries):
+        utterance = {
+            "transcription": results[i]["transcription"],
+            "boundaries": segment_boundaries,
+        }
+        if speakers is not None:
+            utterance["speaker"] = speakers[i]
+        if "emotions" in results[i]:
+            utterance["emotions"] = results[i]["emotions"]
+        transcribed_segments.append(utterance)
+
+    if segmentation["turn_ids"] is not None:
+        transcribed_segments = _join_turn_pieces(transcribed_segments, segmentation["turn_ids"])
+    return transcribed_segments
+
+
+def _transcribe_pooled(model, segments: List[torch.Tensor], batch_size: int) -> List[str]:
+    """
+    Transcribes segments of several recordings with the batched path of the backend:
+    padded encoder batches (`transcribe_batch`), parallel workers (`transcribe_segments`)
+    or one segment at a time.
+    """
+    if hasattr(model, "transcribe_batch"):
+        return model.transcribe_batch(segments, batch_size=batch_size)
+    if hasattr(model, "transcribe_segments"):
+        return model.transcribe_segments(segments)
+    return [model.transcribe_segment(segment) for segment in segments]
+
+
+def transcribe_files(
+    model,
+    wav_files: List[str],
+    device: Union[str, torch.device] = "cpu",
+    vad: str = "pyannote",
+    batch_size: int = 8,
+    decode_workers: int = 4,
+    cancel: Optional[threading.Event] = None,
+    **kwargs,
+) -> Iterator[Tuple[int, Union[List[Dict[str, Union[str, Tuple[float, float]]]], Exception]]]:
+    """
+    Transcribes many (typically short) recordings together.
+    Files are decoded and split by VAD on `decode_workers` threads while the model
+    transcribes already segmented files; segments of different files share encoder
+    batches of `batch_size`. Yields `(file index, utterances)` as soon as every segment
+    of a file is transcribed, or `(file index, exception)` if the file could not be decoded.
+    Setting `cancel` stops the call with `TranscriptionCancelled` before the next batch.
+    """
+    from .vad_utils import segment_audio
+
+    def prepare(wav_file: str) -> Tuple[List[torch.Tensor], List[Tuple[float, float]]]:
+        wav = load_audio(wav_file, return_format="int")
+        return segment_audio(wav, SAMPLE_RATE, device=device, vad=vad, **kwargs)
+
+    # Segments waiting for the model: (file index, segment index, segment)
+    queue: List[Tuple[int, int, torch.Tensor]] = []
+    # Boundaries, transcriptions and the number of untranscribed segments per file
+    files: Dict[int, Dict] = {}
+    executor = ThreadPoolExecutor(max_workers=decode_workers)
+    try:
+        futures = {executor.submit(prepare, path): i for i, path in enumerate(wav_files)}
+        pending = set(futures)
+        while pending or queue:
+            if pending:
+                # Block for decoding only if there is not enough work for a full batch
+                timeout = 0 if len(queue) >= batch_size else None
+                finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = futures[future]
+                    try:
+                        segments, boundaries = future.result()
+                    except Exception as e:
+                        yield index, e
+                        continue
+                    if not segments:
+                        yield index, []
+                        continue
+                    files[index] = {
+                        "boundaries": boundaries,
+                        "texts": [None] * len(segments),
+                        "left": len(segments),
+                    }
+                    queue.extend((index, i, segment) for i, segment in enumerate(segments))
+                if (len(queue) < batch_size and pending) or not queue:
+                    continue
+
+            _check_cancelled(cancel)
+            batch, queue = queue[:batch_size], queue[batch_size:]
+            texts = _transcribe_pooled(model, [segment for _, _, segment in batch], batch_size)
+            for (index, i, _), text in zip(batch, texts):
+                file = files[index]
+                file["texts"][i] = text
+                file["left"] -= 1
+                if file["left"] == 0:
+                    del files[index]
+                    yield index, [
+                        {"transcription": text, "boundaries": boundaries}
+                        for text, boundaries in zip(file["texts"], file["boundaries"])
+                    ]
+    finally:
+        # Stops decoding when the consumer stops early (e.g. the client disconnected)
+        executor.shutdown(cancel_futures=True)
@@ -1,15 +1,17 @@
-from typing import Dict, List, Tuple, Union
+import contextlib
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import hydra
 import omegaconf
 import torch
 from torch import Tensor, nn
 
+from .bucketing import DEFAULT_BUCKETS_SEC, BucketedEncoder
+from .decoder import RNNTDecoderJoint, RNNTEncoderProjection
+from .longform import transcribe_files, transcribe_longform
 from .preprocess import SAMPLE_RATE, load_audio
-from .utils import onnx_converter
-from tqdm import tqdm
-
-from .vad_utils import segment_audio_by_speakers
+from .utils import file_sha256, onnx_converter, profile_range
 
 LONGFORM_THRESHOLD = 25 * SAMPLE_RATE
 
@@ -22,8 +24,16 @@ class GigaAM(nn.Module):
     def __init__(self, cfg: omegaconf.DictConfig):
         super().__init__()
         self.cfg = cfg
-        self.preprocessor = hydra.utils.instantiate(self.cfg.preprocessor)
+        # Filterbank setup needs real tensors, even when the model is built on the meta device
+        with torch.device("cpu"):
+            self.preprocessor = hydra.utils.instantiate(self.cfg.preprocessor)
         self.encoder = hydra.utils.instantiate(self.cfg.encoder)
+        # Opt-in lower precision on CPU (e.g. torch.bfloat16), set by `load_model`
+        self.cpu_autocast_dtype: Optional[torch.dtype] = None
+        # Source checkpoint, recorded in the ONNX export manifest
+        self.checkpoint_path: Optional[str] = None
+        # Compiled encoder with length bucketing, set by `compile_encoder`
+        self.bucketed_encoder: Optional[BucketedEncoder] = None
 
     def forward(
         self,
@@ -33,11 +43,71 @@ class GigaAM(nn.Module):
         """
         Perform forward pass through the preprocessor and encoder.
         """
-        features, feature_lengths = self.preprocessor(features, feature_lengths)
-        if self._device.type == "cpu":
-            return self.encoder(features, feature_lengths)
-        with torch.autocast(device_type=self._device.type, dtype=torch.float16):
-            return self.encoder(features, feature_lengths)
+        with profile_range("preprocess"):
+            features, feature_lengths = self.preprocessor(features, feature_lengths)
+        return self.encode(features, feature_lengths)
+
+    def encode(self, features: Tensor, feature_lengths: Tensor) -> Tuple[Tensor, Tensor]:
+        """
+        Perform forward pass through the encoder on precomputed Log-mel features.
+        """
+        encoder = self.bucketed_encoder or self.encoder
+        with profile_range("encoder"), self._autocast():
+            encoded, encoded_len = encoder(features, feature_lengths)
+        return encoded.float(), encoded_len
+
+    def compile_encoder(
+        self, mode: str = "compile", buckets_sec: Sequence[float] = DEFAULT_BUCKETS_SEC
+    ) -> None:
+        """
+        Compile the encoder (`torch.compile` or TorchScript tracing with mode="script")
+        for a fixed set of segment lengths and batch sizes; inputs are padded up to
+        the nearest bucket. Compilation happens lazily, call `warmup` to trigger it
+        for every length bucket at batch size 1 (larger batches compile on first use).
+        """
+        hop_length = self.preprocessor.hop_length
+        buckets = [int(sec * SAMPLE_RATE) // hop_length + 1 for sec in buckets_sec]
+        self.bucketed_encoder = BucketedEncoder(self.encoder, buckets, mode)
+
+    @torch.inference_mode()
+    def warmup(self) -> Dict[str, float]:
+        """
+        Run the model once per encoder bucket (or once on a 25 s input without bucketing),
+        so that compilation and one-time allocations happen before the first request.
+        Returns the time in seconds spent on every input length.
+        """
+        hop_length = self.preprocessor.hop_length
+        if self.bucketed_encoder is not None:
+            lengths = [(frames - 1) * hop_length for frames in self.bucketed_encoder.buckets]
+        else:
+            lengths = [LONGFORM_THRESHOLD]
+
+        timings = {}
+        for length in lengths:
+            wav = torch.zeros(1, length, device=self._device, dtype=self._dtype)
+            start = time.perf_counter()
+            self._warmup_step(wav)
+            timings[f"{length / SAMPLE_RATE:g}s"] = time.perf_counter() - start
+        return timings
+
+    def _warmup_step(self, wav: Tensor) -> None:
+        self.forward(wav, torch.full([1], wav.shape[-1], device=self._device))
+
+    def _autocast(self) -> contextlib.AbstractContextManager:
+        """
+        Encoder autocast: fp16 on GPU, opt-in `cpu_autocast_dtype` on CPU.
+        """
+        if self._device.type != "cpu":
+            return torch.autocast(device_type=self._device.type, dtype=torch.float16)
+        return self._head_autocast()
+
+    def _head_autocast(self) -> contextlib.AbstractContextManager:
+        """
+        Head autocast: used only in the opt-in lower precision CPU mode.
+        """
+        if self._device.type == "cpu" and self.cpu_autocast_dtype is not None:
+            return torch.autocast(device_type="cpu", dtype=self.cpu_autocast_dtype)
+        return contextlib.nullcontext()
 
     @property
     def _device(self) -> torch.device:
@@ -65,15 +135,29 @@ class GigaAM(nn.Module):
         encoded, encoded_len = self.forward(wav, length)
         return encoded, encoded_len
 
-    def to_onnx(self, dir_path: str = ".") -> None:
+    def _export_options(self, optimize: bool, quantize: Optional[str]) -> Dict:
+        """
+        Options shared by all `onnx_converter` calls of one export.
+        """
+        source_sha256 = None
+        if self.checkpoint_path is not None:
+            source_sha256 = file_sha256(self.checkpoint_path)
+        return {"optimize": optimize, "quantize": quantize, "source_sha256": source_sha256}
+
+    def to_onnx(
+        self, dir_path: str = ".", optimize: bool = False, quantize: Optional[str] = None
+    ) -> None:
         """
         Export onnx model encoder to the specified dir.
+        `optimize` additionally saves ORT-optimized graphs,
+        `quantize="int8"` additionally saves dynamically quantized graphs.
         """
         onnx_converter(
             model_name=f"{self.cfg.model_name}_encoder",
             out_dir=dir_path,
             module=self.encoder,
             dynamic_axes=self.encoder.dynamic_axes(),
+            **self._export_options(optimize, quantize),
         )
 
 
@@ -97,7 +181,8 @@ class GigaAMASR(GigaAM):
             raise ValueError("Too long wav file, use 'transcribe_longform' method.")
 
         encoded, encoded_len = self.forward(wav, length)
-        return self.decoding.decode(self.head, encoded, encoded_len)[0]
+        with self._head_autocast():
+            return self.decoding.decode(self.head, encoded, encoded_len)[0]
 
     def forward_for_export(self, features: Tensor, feature_lengths: Tensor) -> Tensor:
         """
@@ -105,12 +190,22 @@ class GigaAMASR(GigaAM):
         """
         return self.head(self.encoder(features, feature_lengths)[0])
 
-    def to_onnx(self, dir_path: str = ".") -> None:
+    def to_onnx(
+        self,
+        dir_path: str = ".",
+        fused_rnnt: bool = False,
+        optimize: bool = False,
+        quantize: Optional[str] = None,
+    ) -> None:
         """
         Export onnx ASR model.
         `ctc`:  exported entirely in encoder-decoder format.
         `rnnt`: exported in encoder/decoder/joint parts separately.
+                With `fused_rnnt`, exported as encoder with the joint encoder projection
+                and a single decoder+joint step graph instead.
+        `optimize` and `quantize` add ORT-optimized and int8 variants of every part.
         """
+        export_options = self._export_options(optimize, quantize)
         if "ctc" in self.cfg.model_name:
             saved_forward = self.forward
             self.forward = self.forward_for_export
@@ -126,69 +221,135 @@ class GigaAMASR(GigaAM):
                     "feature_lengths": {0: "batch_size"},
                     "log_probs": {0: "batch_size", 1: "seq_len"},
                 },
+                **export_options,
             )
             self.forward = saved_forward
+        elif fused_rnnt:
+            encoder_proj = RNNTEncoderProjection(self.encoder, self.head.joint)
+            onnx_converter(
+                model_name=f"{self.cfg.model_name}_encoder_proj",
+                out_dir=dir_path,
+                module=encoder_proj,
+                dynamic_axes=encoder_proj.dynamic_axes(),
+                **export_options,
+            )
+            onnx_converter(
+                model_name=f"{self.cfg.model_name}_decoder_joint",
+                out_dir=dir_path,
+                module=RNNTDecoderJoint(self.head),
+                **export_options,
+            )
         else:
-            super().to_onnx(dir_path)  # export encoder
+            onnx_converter(
+                model_name=f"{self.cfg.model_name}_encoder",
+                out_dir=dir_path,
+                module=self.encoder,
+                dynamic_axes=self.encoder.dynamic_axes(),
+                **export_options,
+            )
             onnx_converter(
                 model_name=f"{self.cfg.model_name}_decoder",
                 out_dir=dir_path,
                 module=self.head.decoder,
+                **export_options,
             )
             onnx_converter(
                 model_name=f"{self.cfg.model_name}_joint",
                 out_dir=dir_path,
                 module=self.head.joint,
+                **export_options,
             )
 
+    def _warmup_step(self, wav: Tensor) -> None:
+        self.transcribe_segment(wav[0])
+
+    @torch.inference_mode()
+    def transcribe_segment(self, segment: Tensor) -> str:
+        """
+        Transcribes a single float waveform segment already split from a long recording.
+        """
+        wav = segment.to(self._device).unsqueeze(0).to(self._dtype)
+        length = torch.full([1], wav.shape[-1], device=self._device)
+        encoded, encoded_len = self.forward(wav, length)
+        with self._head_autocast():
+            return self.decoding.decode(self.head, encoded, encoded_len)[0]
+
+    @torch.inference_mode()
+    def transcribe_batch(self, segments: List[Tensor], batch_size: int = 8) -> List[str]:
+        """
+        Transcribes float waveform segments (e.g. of several recordings) in zero-padded
+        batches. Segments are sorted by length to reduce padding; results follow the input order.
+        """
+        order = sorted(range(len(segments)), key=lambda i: segments[i].shape[-1])
+        results: List[Optional[str]] = [None] * len(segments)
+        for first in range(0, len(order), batch_size):
+            batch_ids = order[first : first + batch_size]
+            lengths = torch.tensor(
+                [segments[i].shape[-1] for i in batch_ids], device=self._device
+            )
+            wav = torch.zeros(
+                len(batch_ids), int(lengths.max()), device=self._device, dtype=self._dtype
+            )
+            for row, i in enumerate(batch_ids):
+                wav[row, : segments[i].shape[-1]] = segments[i]
+
+            encoded, encoded_len = self.forward(wav, lengths)
+            with self._head_autocast():
+                texts = self.decoding.decode(self.head, encoded, encoded_len)
+            for row, i in enumerate(batch_ids):
+                results[i] = texts[row]
+        return results
+
+    @torch.inference_mode()
+    def transcribe_features(self, features: Tensor) -> str:
+        """
+        Transcribes Log-mel features [n_mels, T] of a single segment,
+        e.g. a slice of `preprocessor.stream` output for the whole recording.
+        """
+        features = features.to(self._device).unsqueeze(0)
+        length = torch.full([1], features.shape[-1], device=self._device)
+        encoded, encoded_len = self.encode(features, length)
+        with self._head_autocast():
+            return self.decoding.decode(self.head, encoded, encoded_len)[0]
+
     @torch.inference_mode()
     def transcribe_longform(
-        self, wav_file: str, use_speaker_diarization: bool = False, **kwargs
+        self,
+        wav_file: str,
+        use_speaker_diarization: bool = False,
+        precompute_features: bool = False,
+        **kwargs,
     ) -> List[Dict[str, Union[str, Tuple[float, float]]]]:
         """
         Transcribes a long audio file by splitting it into segments and
         then transcribing each segment.
+        With `precompute_features`, Log-mel features are computed once for the
+        whole recording and every segment is transcribed from its frame slice.
         """
-        from .vad_utils import segment_audio
-
-        transcribed_segments = []
-        wav = load_audio(wav_file, return_format="int")
-
-        if use_speaker_diarization:
-            segments, boundaries, speakers = segment_audio_by_speakers(
-                wav, SAMPLE_RATE, device=self._device, **kwargs
-            )
-
-            for segment, segment_boundaries, speaker in tqdm(zip(segments, boundaries, speakers)):
-                wav = segment.to(self._device).unsqueeze(0).to(self._dtype)
-                length = torch.full([1], wav.shape[-1], device=self._device)
-                encoded, encoded_len = self.forward(wav, length)
-                result = self.decoding.decode(self.head, encoded, encoded_len)[0]
-                transcribed_segments.append(
-                    {
-                        "transcription": result,
-                        "boundaries": segment_boundaries,
-                        "speaker": speaker,
-                    }
-                )
-            return transcribed_segments
-        else:
+        return transcribe_longform(
+            self,
+            wav_file,
+            use_speaker_diarization=use_speaker_diarization,
+            device=self._device,
+            precompute_features=precompute_features,
+            **kwargs,
+        )
 
-            segments, boundaries = segment_audio(
-                wav, SAMPLE_RATE, device=self._device, **kwargs
-            )
-            for segment, segment_boundaries in tqdm(zip(segments, boundaries)):
-                wav = segment.to(self._device).unsqueeze(0).to(self._dtype)
-                length = torch.full([1], wav.shape[-1], device=self._device)
-                encoded, encoded_len = self.forward(wav, length)
-                result = self.decoding.decode(self.head, encoded, encoded_len)[0]
-                transcribed_segments.append(
-                    {
-                        "transcription": result,
-                        "boundaries": segment_boundaries,
-                    }
-                )
-            return transcribed_segments
+    def transcribe_files(
+        self, wav_files: List[str], batch_size: int = 8, decode_workers: int = 4, **kwargs
+    ) -> Iterator[Tuple[int, Union[List[Dict[str, Union[str, Tuple[float, float]]]], Exception]]]:
+        """
+        Transcribes many recordings, sharing padded encoder batches between files.
+        Yields `(file index, utterances)` as every file completes (see `longform.transcribe_files`).
+        """
+        return transcribe_files(
+            self,
+            wav_files,
+            device=self._device,
+            batch_size=batch_size,
+            decode_workers=decode_workers,
+            **kwargs,
+        )
 
 
 class GigaAMEmo(GigaAM):
@@ -201,6 +362,7 @@ class GigaAMEmo(GigaAM):
         self.head = hydra.utils.instantiate(self.cfg.head)
         self.id2name = cfg.id2name
 
+    @torch.inference_mode()
     def get_probs(self, wav_file: str) -> Dict[str, float]:
         """
         Calculate probabilities for each emotion class based on the provided audio file.
@@ -216,6 +378,41 @@ class GigaAMEmo(GigaAM):
 
         return {self.id2name[i]: probs[i] for i in range(len(self.id2name))}
 
+    @torch.inference_mode()
+    def get_probs_batch(
+        self, segments: List[Tensor], batch_size: int = 8
+    ) -> List[Dict[str, float]]:
+        """
+        Calculate emotion probabilities for every float waveform segment
+        (e.g. VAD or diarization segments of one recording).
+        Segments are sorted by length and run in zero-padded batches; encoder outputs
+        are averaged over valid frames only, so padding does not affect the result.
+        """
+        order = sorted(range(len(segments)), key=lambda i: segments[i].shape[-1])
+        results: List[Optional[Dict[str, float]]] = [None] * len(segments)
+        for first in range(0, len(order), batch_size):
+            batch_ids = order[first : first + batch_size]
+            lengths = torch.tensor(
+                [segments[i].shape[-1] for i in batch_ids], device=self._device
+            )
+            wav = torch.zeros(
+                len(batch_ids), int(lengths.max()), device=self._device, dtype=self._dtype
+            )
+            for row, i in enumerate(batch_ids):
+                wav[row, : segments[i].shape[-1]] = segments[i]
+
+            encoded, encoded_len = self.forward(wav, lengths)
+            frames = torch.arange(encoded.shape[-1], device=self._device)
+            valid = frames < encoded_len[:, None]
+            encoded_pooled = (encoded * valid[:, None, :]).sum(-1) / encoded_len[:, None]
+
+            probs = nn.functional.softmax(self.head(encoded_pooled), dim=-1).tolist()
+            for row, i in enumerate(batch_ids):
+                results[i] = {
+                    self.id2name[j]: probs[row][j] for j in range(len(self.id2name))
+                }
+        return results
+
     def forward_for_export(self, features: Tensor, feature_lengths: Tensor) -> Tensor:
         """
         Encoder-decoder forward to save model entirely in onnx format.
@@ -226,7 +423,9 @@ class GigaAMEmo(GigaAM):
         ).squeeze(-1)
         return nn.functional.softmax(self.head(enc_pooled)[0], dim=-1)
 
-    def to_onnx(self, dir_path: str = ".") -> None:
+    def to_onnx(
+        self, dir_path: str = ".", optimize: bool = False, quantize: Optional[str] = None
+    ) -> None:
         """
         Export onnx Emo model.
         """
@@ -244,5 +443,6 @@ class GigaAMEmo(GigaAM):
                 "feature_lengths": {0: "batch_size"},
                 "probs": {0: "batch_size", 1: "seq_len"},
             },
+            **self._export_options(optimize, quantize),
         )
         self.forward = saved_forward
@@ -1,13 +1,20 @@
+import os
+import queue
+import time
 import warnings
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import onnxruntime as rt
 import torch
+from torch import Tensor
 
-warnings.simplefilter("ignore", category=UserWarning)
+from .longform import transcribe_files, transcribe_longform
+from .preprocess import FeatureExtractor, load_audio
+from .utils import available_cpus, resolve_onnx_path
 
-import gigaam
+warnings.simplefilter("ignore", category=UserWarning)
 
 D_MODEL = 768
 DTYPE = np.float32
@@ -53,114 +60,513 @@ VOCAB = [
 ]
 
 
-def transcribe_sample(
-    wav_file: str,
-    model_type: str,
-    sessions: List[rt.InferenceSession],
-    preprocessor: Optional[gigaam.preprocess.FeatureExtractor] = None,
-) -> str:
-    if preprocessor is None:
-        preprocessor = gigaam.preprocess.FeatureExtractor(SAMPLE_RATE, FEAT_IN)
-
-    assert model_type in ["ctc", "rnnt"], "Only `ctc` and `rnnt` inference supported"
-
-    input_signal = gigaam.load_audio(wav_file)
-    input_signal = preprocessor(
-        input_signal.unsqueeze(0), torch.tensor([input_signal.shape[-1]])
-    )[0].numpy()
-
-    enc_sess = sessions[0]
+def _encode(
+    enc_sess: rt.InferenceSession,
+    features: np.ndarray,
+) -> np.ndarray:
+    """
+    Run the encoder (or the whole CTC model) session on log-mel features [1, FEAT_IN, T].
+    """
     enc_inputs = {
         node.name: data
         for (node, data) in zip(
             enc_sess.get_inputs(),
-            [input_signal.astype(DTYPE), [input_signal.shape[-1]]],
+            [features.astype(DTYPE), [features.shape[-1]]],
         )
     }
-    enc_features = enc_sess.run(
-        [node.name for node in enc_sess.get_outputs()], enc_inputs
-    )[0]
+    return enc_sess.run([node.name for node in enc_sess.get_outputs()], enc_inputs)[0]
+
+
+def _ctc_greedy_decode(log_probs: np.ndarray) -> List[int]:
+    token_ids = []
+    prev_tok = BLANK_IDX
+    for tok in log_probs.argmax(-1).squeeze().tolist():
+        if (tok != prev_tok or prev_tok == BLANK_IDX) and tok != BLANK_IDX:
+            token_ids.append(tok)
+        prev_tok = tok
+    return token_ids
+
 
+def _rnnt_greedy_decode(
+    enc_features: np.ndarray,
+    pred_sess: rt.InferenceSession,
+    joint_sess: rt.InferenceSession,
+) -> List[int]:
     token_ids = []
     prev_token = BLANK_IDX
-    if model_type == "ctc":
-        prev_tok = BLANK_IDX
-        for tok in enc_features.argmax(-1).squeeze().tolist():
-            if (tok != prev_tok or prev_tok == BLANK_IDX) and tok != BLANK_IDX:
-                token_ids.append(tok)
-            prev_tok = tok
-    else:
-        pred_states = [
-            np.zeros(shape=(1, 1, PRED_HIDDEN), dtype=DTYPE),
-            np.zeros(shape=(1, 1, PRED_HIDDEN), dtype=DTYPE),
-        ]
-        pred_sess, joint_sess = sessions[1:]
-        for j in range(enc_features.shape[-1]):
-            emitted_letters = 0
-            while emitted_letters < MAX_LETTERS_PER_FRAME:
-                pred_inputs = {
-                    node.name: data
-                    for (node, data) in zip(
-                        pred_sess.get_inputs(), [[[prev_token]]] + pred_states
-                    )
-                }
-                pred_outputs = pred_sess.run(
-                    [node.name for node in pred_sess.get_outputs()], pred_inputs
+    pred_states = [
+        np.zeros(shape=(1, 1, PRED_HIDDEN), dtype=DTYPE),
+        np.zeros(shape=(1, 1, PRED_HIDDEN), dtype=DTYPE),
+    ]
+    for j in range(enc_features.shape[-1]):
+        emitted_letters = 0
+        while emitted_letters < MAX_LETTERS_PER_FRAME:
+            pred_inputs = {
+                node.name: data
+                for (node, data) in zip(
+                    pred_sess.get_inputs(), [[[prev_token]]] + pred_states
                 )
+            }
+            pred_outputs = pred_sess.run(
+                [node.name for node in pred_sess.get_outputs()], pred_inputs
+            )
 
-                joint_inputs = {
-                    node.name: data
-                    for node, data in zip(
-                        joint_sess.get_inputs(),
-                        [enc_features[:, :, [j]], pred_outputs[0].swapaxes(1, 2)],
-                    )
-                }
-                log_probs = joint_sess.run(
-                    [node.name for node in joint_sess.get_outputs()], joint_inputs
+            joint_inputs = {
+                node.name: data
+                for node, data in zip(
+                    joint_sess.get_inputs(),
+                    [enc_features[:, :, [j]], pred_outputs[0].swapaxes(1, 2)],
                 )
-                token = log_probs[0].argmax(-1)[0][0]
-
-                if token != BLANK_IDX:
-                    prev_token = int(token)
-                    pred_states = pred_outputs[1:]
-                    token_ids.append(int(token))
-                    emitted_letters += 1
-                else:
+            }
+            log_probs = joint_sess.run(
+                [node.name for node in joint_sess.get_outputs()], joint_inputs
+            )
+            token = log_probs[0].argmax(-1)[0][0]
+
+            if token != BLANK_IDX:
+                prev_token = int(token)
+                pred_states = pred_outputs[1:]
+                token_ids.append(int(token))
+                emitted_letters += 1
+            else:
+                break
+    return token_ids
+
+
+class FusedRNNTDecoder:
+    """
+    Greedy RNN-T decoding over the fused decoder+joint step graph
+    (see `GigaAMASR.to_onnx(fused_rnnt=True)`).
+    Inputs and outputs are bound once via IOBinding to preallocated buffers,
+    so each step is a single `run_with_iobinding` call without dict or array rebuilding.
+    Buffers are per-instance: use one decoder per thread.
+    """
+
+    def __init__(self, step_sess: rt.InferenceSession):
+        self.sess = step_sess
+        enc_node, x_node, h_node, c_node = step_sess.get_inputs()
+        self.enc = np.zeros(enc_node.shape, dtype=DTYPE)
+        self.x = np.full((1, 1), BLANK_IDX, dtype=np.int64)
+        self.h = np.zeros(h_node.shape, dtype=DTYPE)
+        self.c = np.zeros(c_node.shape, dtype=DTYPE)
+        self.token = np.zeros((1, 1), dtype=np.int64)
+        self.h_out = np.zeros_like(self.h)
+        self.c_out = np.zeros_like(self.c)
+
+        self.binding = step_sess.io_binding()
+        # OrtValues wrap the numpy buffers without copying and must stay alive
+        self._ort_values = []
+        for node, buffer in zip(
+            [enc_node, x_node, h_node, c_node], [self.enc, self.x, self.h, self.c]
+        ):
+            value = rt.OrtValue.ortvalue_from_numpy(buffer)
+            self.binding.bind_ortvalue_input(node.name, value)
+            self._ort_values.append(value)
+        for node, buffer in zip(
+            step_sess.get_outputs(), [self.token, self.h_out, self.c_out]
+        ):
+            value = rt.OrtValue.ortvalue_from_numpy(buffer)
+            self.binding.bind_ortvalue_output(node.name, value)
+            self._ort_values.append(value)
+
+    def decode(self, enc_proj: np.ndarray) -> List[int]:
+        """
+        Decode a projected encoder sequence [T, joint_hidden] into token ids.
+        """
+        token_ids = []
+        self.x[0, 0] = BLANK_IDX
+        self.h.fill(0.0)
+        self.c.fill(0.0)
+        for frame in enc_proj:
+            self.enc[0] = frame
+            emitted_letters = 0
+            while emitted_letters < MAX_LETTERS_PER_FRAME:
+                self.sess.run_with_iobinding(self.binding)
+                token = int(self.token[0, 0])
+                if token == BLANK_IDX:
                     break
+                token_ids.append(token)
+                self.x[0, 0] = token
+                np.copyto(self.h, self.h_out)
+                np.copyto(self.c, self.c_out)
+                emitted_letters += 1
+        return token_ids
+
+
+def transcribe_features(
+    features: np.ndarray,
+    model_type: str,
+    sessions: List[rt.InferenceSession],
+    fused_decoder: Optional[FusedRNNTDecoder] = None,
+) -> str:
+    """
+    Transcribe log-mel features [1, FEAT_IN, T] with ONNX Runtime sessions:
+    `ctc`: [model], `rnnt`: [encoder, decoder, joint] or fused [encoder_proj, decoder_joint].
+    `fused_decoder` reuses the bound buffers of a decoder created for `sessions[1]`.
+    """
+    assert model_type in ["ctc", "rnnt"], "Only `ctc` and `rnnt` inference supported"
+
+    enc_features = _encode(sessions[0], features)
+    if model_type == "ctc":
+        token_ids = _ctc_greedy_decode(enc_features)
+    elif len(sessions) == 2:
+        if fused_decoder is None:
+            fused_decoder = FusedRNNTDecoder(sessions[1])
+        token_ids = fused_decoder.decode(enc_features[0])
+    else:
+        token_ids = _rnnt_greedy_decode(enc_features, *sessions[1:])
 
     return "".join(VOCAB[tok] for tok in token_ids)
 
 
+def transcribe_sample(
+    wav_file: str,
+    model_type: str,
+    sessions: List[rt.InferenceSession],
+    preprocessor: Optional[FeatureExtractor] = None,
+) -> str:
+    if preprocessor is None:
+        preprocessor = FeatureExtractor(SAMPLE_RATE, FEAT_IN)
+
+    input_signal = load_audio(wav_file)
+    input_signal = preprocessor(
+        input_signal.unsqueeze(0), torch.tensor([input_signal.shape[-1]])
+    )[0].numpy()
+    return transcribe_features(input_signal, model_type, sessions)
+
+
+def session_options(
+    intra_op_num_threads: Optional[int] = None,
+    cores: Optional[Sequence[int]] = None,
+) -> rt.SessionOptions:
+    """
+    Session options with an explicit intra-op thread budget
+    (all available cores by default), optionally pinned to `cores`.
+    """
+    if intra_op_num_threads is None:
+        intra_op_num_threads = len(cores) if cores else len(available_cpus())
+
+    opts = rt.SessionOptions()
+    opts.intra_op_num_threads = intra_op_num_threads
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = rt.ExecutionMode.ORT_SEQUENTIAL
+    if cores and intra_op_num_threads > 1:
+        # The calling thread is thread 0; affinities are set for the remaining
+        # pool threads, using 1-based logical processor ids
+        affinities = [
+            str(cores[i % len(cores)] + 1) for i in range(1, intra_op_num_threads)
+        ]
+        opts.add_session_config_entry(
+            "session.intra_op_thread_affinities", ";".join(affinities)
+        )
+    return opts
+
+
 def load_onnx_sessions(
     onnx_dir: str,
     model_type: str,
     model_version: Optional[str] = None,
+    fused_rnnt: bool = False,
+    opts: Optional[rt.SessionOptions] = None,
+    variant: Optional[str] = None,
 ) -> List[rt.InferenceSession]:
+    """
+    Create sessions for the exported model parts. Unless `variant` is given,
+    each part is loaded from its most optimized variant listed in the export manifest.
+    An `fp32` variant missing from the manifest is loaded from `{part}.onnx`.
+    """
     if model_version is None:
         model_version = "v2"
+    if opts is None:
+        opts = session_options()
 
-    opts = rt.SessionOptions()
-    opts.intra_op_num_threads = 16
-    opts.execution_mode = rt.ExecutionMode.ORT_SEQUENTIAL
-
+    pth = f"{model_version}_{model_type}"
     if model_type == "ctc":
-        model_path = f"{onnx_dir}/{model_version}_{model_type}.onnx"
-        sessions = [
-            rt.InferenceSession(
-                model_path, providers=["CPUExecutionProvider"], sess_options=opts
+        parts = [pth]
+    elif fused_rnnt:
+        parts = [f"{pth}_encoder_proj", f"{pth}_decoder_joint"]
+    else:
+        parts = [f"{pth}_encoder", f"{pth}_decoder", f"{pth}_joint"]
+
+    def part_path(part: str) -> str:
+        try:
+            return resolve_onnx_path(onnx_dir, part, variant)
+        except ValueError:
+            # Exports made before the manifest existed contain only the fp32 graphs
+            if variant == "fp32":
+                return os.path.join(onnx_dir, f"{part}.onnx")
+            raise
+
+    return [
+        rt.InferenceSession(
+            part_path(part),
+            providers=["CPUExecutionProvider"],
+            sess_options=opts,
+        )
+        for part in parts
+    ]
+
+
+class OnnxSessionPool:
+    """
+    Pool of independent ONNX Runtime session replicas.
+    Each replica gets its own share of the available cores, so concurrent requests
+    lease a replica instead of contending for one set of sessions.
+    Note that every replica holds its own copy of the weights.
+    """
+
+    def __init__(self, replicas: List[List[rt.InferenceSession]]):
+        assert replicas, "At least one replica is required"
+        self.size = len(replicas)
+        self._free: "queue.Queue[List[rt.InferenceSession]]" = queue.Queue()
+        for sessions in replicas:
+            self._free.put(sessions)
+
+    @classmethod
+    def load(
+        cls,
+        onnx_dir: str,
+        model_type: str,
+        model_version: Optional[str] = None,
+        fused_rnnt: bool = False,
+        num_replicas: int = 1,
+        threads_per_replica: Optional[int] = None,
+        pin_cores: bool = False,
+        variant: Optional[str] = None,
+    ) -> "OnnxSessionPool":
+        """
+        Create `num_replicas` session sets. By default the available cores are
+        split evenly between replicas; with `pin_cores` each replica's threads
+        are pinned to its own core set. `variant` selects the exported graph
+        variant (see `load_onnx_sessions`).
+        """
+        cpus = available_cpus()
+        if threads_per_replica is None:
+            threads_per_replica = max(1, len(cpus) // num_replicas)
+
+        replicas = []
+        for i in range(num_replicas):
+            cores = None
+            if pin_cores:
+                offset = i * threads_per_replica % len(cpus)
+                cores = (cpus[offset:] + cpus[:offset])[:threads_per_replica]
+            opts = session_options(threads_per_replica, cores)
+            replicas.append(
+                load_onnx_sessions(
+                    onnx_dir,
+                    model_type,
+                    model_version,
+                    fused_rnnt=fused_rnnt,
+                    opts=opts,
+                    variant=variant,
+                )
             )
-        ]
+        return cls(replicas)
+
+    @contextmanager
+    def lease(self) -> Iterator[List[rt.InferenceSession]]:
+        """
+        Borrow a replica for the duration of the context, waiting for a free one.
+        """
+        sessions = self._free.get()
+        try:
+            yield sessions
+        finally:
+            self._free.put(sessions)
+
+    @contextmanager
+    def lease_all(self) -> Iterator[List[List[rt.InferenceSession]]]:
+        """
+        Borrow every replica, e.g. to warm them up.
+        """
+        replicas = [self._free.get() for _ in range(self.size)]
+        try:
+            yield replicas
+        finally:
+            for sessions in replicas:
+                self._free.put(sessions)
+
+
+class OnnxASR:
+    """
+    GigaAM ASR running on ONNX Runtime sessions.
+    Exposes the same transcription methods as `GigaAMASR`,
+    so it can replace the torch model in long-form pipelines and the API.
+    """
+
+    def __init__(
+        self,
+        model_type: str,
+        sessions: Union[List[rt.InferenceSession], OnnxSessionPool],
+        preprocessor: Optional[FeatureExtractor] = None,
+    ):
+        assert model_type in ["ctc", "rnnt"], "Only `ctc` and `rnnt` inference supported"
+        self.model_type = model_type
+        if not isinstance(sessions, OnnxSessionPool):
+            sessions = OnnxSessionPool([sessions])
+        self.pool = sessions
+        self.preprocessor = preprocessor or FeatureExtractor(SAMPLE_RATE, FEAT_IN)
+        # One fused decoder per replica; a leased replica is used by a single thread,
+        # so its decoder buffers are reused across segments without locking
+        self._decoders: Dict[int, FusedRNNTDecoder] = {}
+
+    def _fused_decoder(
+        self, sessions: List[rt.InferenceSession]
+    ) -> Optional[FusedRNNTDecoder]:
+        if self.model_type != "rnnt" or len(sessions) != 2:
+            return None
+        decoder = self._decoders.get(id(sessions[1]))
+        if decoder is None:
+            decoder = self._decoders[id(sessions[1])] = FusedRNNTDecoder(sessions[1])
+        return decoder
+
+    @torch.inference_mode()
+    def transcribe_segment(self, segment: Tensor) -> str:
+        """
+        Transcribes a single float waveform segment.
+        """
+        features = self.preprocessor(
+            segment.float().unsqueeze(0), torch.tensor([segment.shape[-1]])
+        )[0]
+        return self.transcribe_features(features[0])
+
+    def transcribe_features(self, features: Tensor) -> str:
+        """
+        Transcribes Log-mel features [n_mels, T] of a single segment.
+        """
+        features = features.unsqueeze(0).numpy()
+        with self.pool.lease() as sessions:
+            return transcribe_features(
+                features, self.model_type, sessions, self._fused_decoder(sessions)
+            )
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        Run every session replica once, so that one-time allocations
+        happen before the first request. Returns the time per replica.
+        """
+        timings = {}
+        segment = torch.zeros(SAMPLE_RATE * 4)
+        features = self.preprocessor(
+            segment.unsqueeze(0), torch.tensor([segment.shape[-1]])
+        )[0].numpy()
+        with self.pool.lease_all() as replicas:
+            for i, sessions in enumerate(replicas):
+                start = time.perf_counter()
+                transcribe_features(
+                    features, self.model_type, sessions, self._fused_decoder(sessions)
+                )
+                timings[f"replica_{i}"] = time.perf_counter() - start
+        return timings
+
+    def transcribe(self, wav_file: str) -> str:
+        """
+        Transcribes a short audio file into text.
+        """
+        return self.transcribe_segment(load_audio(wav_file))
+
+    def transcribe_longform(
+        self,
+        wav_file: str,
+        use_speaker_diarization: bool = False,
+        precompute_features: bool = False,
+        **kwargs,
+    ) -> List[Dict[str, Union[str, Tuple[float, float]]]]:
+        """
+        Transcribes a long audio file by splitting it into segments and
+        then transcribing each segment.
+        """
+        return transcribe_longform(
+            self,
+            wav_file,
+            use_speaker_diarization=use_speaker_diarization,
+            device="cpu",
+            precompute_features=precompute_features,
+            **kwargs,
+        )
+
+    def transcribe_files(
+        self, wav_files: List[str], batch_size: int = 8, decode_workers: int = 4, **kwargs
+    ) -> Iterator[Tuple[int, Union[List[Dict[str, Union[str, Tuple[float, float]]]], Exception]]]:
+        """
+        Transcribes many recordings; files are decoded and segmented concurrently
+        while segments are transcribed one at a time.
+        Yields `(file index, utterances)` as every file completes (see `longform.transcribe_files`).
+        """
+        return transcribe_files(
+            self,
+            wav_files,
+            device="cpu",
+            batch_size=batch_size,
+            decode_workers=decode_workers,
+            **kwargs,
+        )
+
+
+def load_onnx_model(
+    model_name: str,
+    onnx_dir: str,
+    download_root: Optional[str] = None,
+    fused_rnnt: bool = True,
+    num_replicas: int = 1,
+    threads_per_replica: Optional[int] = None,
+    pin_cores: bool = False,
+    optimize: bool = False,
+    quantize: Optional[str] = None,
+) -> OnnxASR:
+    """
+    Load an ONNX Runtime ASR backend for `model_name` (`v2_ctc` or `v2_rnnt`).
+    Missing ONNX files are exported from the torch checkpoint on first use,
+    including the ORT-optimized (`optimize`) and int8 (`quantize`) variants;
+    sessions use exactly the variant selected by `optimize` and `quantize`,
+    even if other variants are present in `onnx_dir`.
+    RNN-T models use the fused decoder+joint graph unless `fused_rnnt` is False.
+    `num_replicas`, `threads_per_replica` and `pin_cores` configure the session pool.
+    """
+    from . import load_model
+
+    if model_name in ["ctc", "rnnt"]:
+        model_name = f"v2_{model_name}"
+    if model_name not in ["v2_ctc", "v2_rnnt"]:
+        raise ValueError(
+            f"ONNX inference supports only v2_ctc and v2_rnnt models, got '{model_name}'"
+        )
+    model_version, model_type = model_name.split("_")
+
+    fused_rnnt = fused_rnnt and model_type == "rnnt"
+    if model_type == "ctc":
+        first_file = model_name
+    elif fused_rnnt:
+        first_file = f"{model_name}_encoder_proj"
     else:
-        pth = f"{onnx_dir}/{model_version}_{model_type}"
-        enc_sess = rt.InferenceSession(
-            f"{pth}_encoder.onnx", providers=["CPUExecutionProvider"], sess_options=opts
+        first_file = f"{model_name}_encoder"
+    wanted_variant = (quantize or "fp32") + ("_opt" if optimize else "")
+    try:
+        exported = os.path.exists(
+            resolve_onnx_path(onnx_dir, first_file, wanted_variant)
+        )
+    except ValueError:
+        # Exports made before the manifest existed contain only the fp32 graphs
+        exported = wanted_variant == "fp32" and os.path.exists(
+            os.path.join(onnx_dir, f"{first_file}.onnx")
         )
-        pred_sess = rt.InferenceSession(
-            f"{pth}_decoder.onnx", providers=["CPUExecutionProvider"], sess_options=opts
+    if not exported:
+        model = load_model(
+            model_name, fp16_encoder=False, device="cpu", download_root=download_root
         )
-        joint_sess = rt.InferenceSession(
-            f"{pth}_joint.onnx", providers=["CPUExecutionProvider"], sess_options=opts
+        model.to_onnx(
+            dir_path=onnx_dir, fused_rnnt=fused_rnnt, optimize=optimize, quantize=quantize
         )
-        sessions = [enc_sess, pred_sess, joint_sess]
+        del model
 
-    return sessions
+    pool = OnnxSessionPool.load(
+        onnx_dir,
+        model_type,
+        model_version,
+        fused_rnnt=fused_rnnt,
+        num_replicas=num_replicas,
+        threads_per_replica=threads_per_replica,
+        pin_cores=pin_cores,
+        variant=wanted_variant,
+    )
+    return OnnxASR(model_type, pool)
@@ -6,6 +6,17 @@ import torchaudio
 from torch import Tensor, nn
 
 SAMPLE_RATE = 16000
+# ffmpeg decoding threads per `load_audio` call, 0 lets ffmpeg use all cores
+_FFMPEG_THREADS = 0
+
+
+def set_ffmpeg_threads(threads: int) -> None:
+    """
+    Sets the number of ffmpeg threads used by `load_audio`, e.g. to keep
+    concurrent decoding within the CPU budget of the inference threads.
+    """
+    global _FFMPEG_THREADS
+    _FFMPEG_THREADS = max(0, threads)
 
 
 def load_audio(
@@ -18,7 +29,7 @@ def load_audio(
         "ffmpeg",
         "-nostdin",
         "-threads",
-        "0",
+        str(_FFMPEG_THREADS),
         "-i",
         audio_path,
         "-f",
@@ -84,3 +95,55 @@ class FeatureExtractor(nn.Module):
         Extract Log-mel spectrogram features from the input audio signal.
         """
         return self.featurizer(input_signal), self.out_len(length)
+
+    @torch.inference_mode()
+    def stream(self, wav: Tensor, chunk_frames: int = 6000) -> Tensor:
+        """
+        Extract Log-mel spectrogram features [features, T] of a whole 1D recording,
+        running the STFT over chunks of `chunk_frames` frames to bound peak memory.
+        Frames match `forward` on the full recording; recordings shorter than
+        half an FFT window are passed to `forward` as is.
+        """
+        melspec = self.featurizer[0]
+        spec = melspec.spectrogram
+        window = spec.window
+        half_fft = spec.n_fft // 2
+        if wav.shape[-1] <= half_fft:
+            # Too short for reflect padding: a single chunk, computed as in `forward`
+            return self.featurizer(wav.float()[None].to(window.device))[0]
+
+        # Same centering as `forward`: reflect padding at the recording edges only
+        padded = nn.functional.pad(
+            wav.float()[None, None], (half_fft, half_fft), mode="reflect"
+        )[0, 0]
+        num_frames = wav.shape[-1] // self.hop_length + 1
+        out = torch.empty(
+            melspec.n_mels, num_frames, device=window.device, dtype=window.dtype
+        )
+        for first in range(0, num_frames, chunk_frames):
+            last = min(first + chunk_frames, num_frames)
+            piece = padded[
+                first * self.hop_length : (last - 1) * self.hop_length + spec.n_fft
+            ].to(window.device)
+            power = torchaudio.functional.spectrogram(
+                piece,
+                pad=0,
+                window=window,
+                n_fft=spec.n_fft,
+                hop_length=self.hop_length,
+                win_length=spec.win_length,
+                power=spec.power,
+                normalized=spec.normalized,
+                center=False,
+            )
+            out[:, first:last] = self.featurizer[1](melspec.mel_scale(power))
+        return out
+
+    def frame_slice(self, start_sample: int, num_samples: int) -> slice:
+        """
+        Frames of `stream` output covering a segment of the recording, with the same
+        frame count `forward` would produce for the segment alone.
+        Segment start is rounded to the nearest frame (at most half a hop off).
+        """
+        first = (start_sample + self.hop_length // 2) // self.hop_length
+        return slice(first, first + num_samples // self.hop_length + 1)
@@ -0,0 +1,53 @@
+from typing import List
+
+import torch
+from torch import nn
+
+QUANTIZATION_MODES = ["int8"]
+
+
+def _quantization_targets(model: nn.Module, quantize_joint: bool) -> List[str]:
+    """
+    Names of the submodules whose `nn.Linear` layers are quantized.
+    """
+    targets = ["encoder"]
+    if quantize_joint and hasattr(getattr(model, "head", None), "joint"):
+        targets.append("head.joint")
+    return targets
+
+
+def quantize_int8(model: nn.Module, quantize_joint: bool = False) -> nn.Module:
+    """
+    Applies dynamic int8 quantization in place to the `nn.Linear` layers of the
+    Conformer encoder (feed-forward, attention projections, pre_encode output)
+    and, optionally, of the RNN-T joint. CPU only.
+    """
+    for target in _quantization_targets(model, quantize_joint):
+        torch.ao.quantization.quantize_dynamic(
+            model.get_submodule(target), {nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    return model
+
+
+def _swap_linear(module: nn.Module) -> None:
+    for name, child in module.named_children():
+        if type(child) is nn.Linear:
+            quantized = torch.ao.nn.quantized.dynamic.Linear(
+                child.in_features,
+                child.out_features,
+                bias_=child.bias is not None,
+                dtype=torch.qint8,
+            )
+            setattr(module, name, quantized)
+        else:
+            _swap_linear(child)
+
+
+def prepare_int8(model: nn.Module, quantize_joint: bool = False) -> nn.Module:
+    """
+    Replaces the same `nn.Linear` layers as `quantize_int8` with empty dynamic int8
+    layers, so that a cached quantized state dict can be loaded without re-quantizing.
+    """
+    for target in _quantization_targets(model, quantize_joint):
+        _swap_linear(model.get_submodule(target))
+    return model
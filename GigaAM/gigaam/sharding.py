@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from .longform import transcribe_files, transcribe_longform
+from .utils import threads_per_job
+
+T = TypeVar("T")
+
+# Model of the current worker process, set by `_init_worker`
+_WORKER_MODEL = None
+
+
+def _init_worker(model_name: str, num_threads: int, load_kwargs: Dict) -> None:
+    global _WORKER_MODEL
+    from . import load_model
+
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+    _WORKER_MODEL = load_model(model_name, device="cpu", **load_kwargs)
+
+
+def _transcribe(segment: np.ndarray) -> str:
+    return _WORKER_MODEL.transcribe_segment(torch.from_numpy(segment))
+
+
+def _warmup(_: int) -> Dict[str, float]:
+    return _WORKER_MODEL.warmup()
+
+
+class ShardedTranscriber:
+    """
+    Transcribes the segments of a long recording on a pool of worker processes.
+    Every worker loads the model on CPU with its own `torch.set_num_threads` budget;
+    weights come from the memory-mapped converted checkpoint (see `load_model`),
+    so the page cache shares them between workers. The checkpoint is converted once
+    in the parent process before the workers start.
+    If a worker dies (e.g. killed for lack of memory), the pool is recreated and
+    the call is retried once.
+    Exposes `transcribe_longform` like `GigaAMASR`; results keep the segment order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        num_workers: int,
+        threads_per_worker: Optional[int] = None,
+        **load_kwargs,
+    ):
+        from . import load_model
+
+        if threads_per_worker is None:
+            threads_per_worker = threads_per_job(num_workers)
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self._initargs = (model_name, threads_per_worker, load_kwargs)
+        # Write the converted checkpoint here (the model itself is discarded), so that
+        # workers only memory-map it instead of each converting the full checkpoint at once
+        load_model(model_name, device="cpu", **load_kwargs)
+        self._lock = threading.Lock()
+        self.executor = self._create_pool()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    def _run(self, call: Callable[[ProcessPoolExecutor], T]) -> T:
+        executor = self.executor
+        try:
+            return call(executor)
+        except BrokenProcessPool:
+            logging.warning("A transcription worker died, restarting the worker pool...")
+            with self._lock:
+                # Concurrent callers share one restart
+                if self.executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._create_pool()
+            return call(self.executor)
+
+    def transcribe_segments(self, segments: List[Tensor]) -> List[str]:
+        """
+        Transcribes float waveform segments in parallel. Longer segments are
+        submitted first for better load balance; results follow the input order.
+        """
+        order = sorted(range(len(segments)), key=lambda i: -segments[i].shape[-1])
+
+        def call(executor: ProcessPoolExecutor) -> List[str]:
+            # numpy arrays pickle only the segment, not the storage of the whole recording
+            futures = {i: executor.submit(_transcribe, segments[i].numpy()) for i in order}
+            return [futures[i].result() for i in range(len(segments))]
+
+        return self._run(call)
+
+    def transcribe_segment(self, segment: Tensor) -> str:
+        return self.transcribe_segments([segment])[0]
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        Starts the workers and loads the model in each of them.
+        Returns the time in seconds until all workers are ready.
+        """
+        start = time.perf_counter()
+        self._run(lambda executor: list(executor.map(_warmup, range(self.num_workers))))
+        return {f"{self.num_workers}_workers": time.perf_counter() - start}
+
+    def transcribe_longform(
+        self, wav_file: str, use_speaker_diarization: bool = False, **kwargs
+    ) -> List[Dict[str, Union[str, Tuple[float, float]]]]:
+        """
+        Transcribes a long audio file by splitting it into segments and
+        transcribing the segments on the worker processes.
+        """
+        kwargs.pop("precompute_features", None)
+        return transcribe_longform(
+            self,
+            wav_file,
+            use_speaker_diarization=use_speaker_diarization,
+            device="cpu",
+            **kwargs,
+        )
+
+    def transcribe_files(
+        self, wav_files: List[str], batch_size: int = 8, decode_workers: int = 4, **kwargs
+    ) -> Iterator[Tuple[int, Union[List[Dict[str, Union[str, Tuple[float, float]]]], Exception]]]:
+        """
+        Transcribes many recordings; segments of several files are transcribed
+        together on the worker processes.
+        Yields `(file index, utterances)` as every file completes (see `longform.transcribe_files`).
+        """
+        return transcribe_files(
+            self,
+            wav_files,
+            device="cpu",
+            batch_size=batch_size,
+            decode_workers=decode_workers,
+            **kwargs,
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown()
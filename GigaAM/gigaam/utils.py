@@ -1,3 +1,7 @@
+import contextlib
+import hashlib
+import json
+import os
 import warnings
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union
@@ -8,6 +12,90 @@ from torch import Tensor
 from torch.jit import TracerWarning
 
 
+# ONNX artifact variants in order of preference for loading
+ONNX_VARIANTS = ["int8_opt", "int8", "fp32_opt", "fp32"]
+ONNX_MANIFEST = "manifest.json"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA256 hex digest of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def optimize_onnx(model_path: str, out_path: str) -> str:
+    """
+    Runs ONNX Runtime extended graph optimizations for the CPU provider
+    and saves the optimized model. The result should be used on the same kind of hardware.
+    """
+    import onnxruntime as rt
+
+    opts = rt.SessionOptions()
+    opts.graph_optimization_level = rt.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    opts.optimized_model_filepath = out_path
+    rt.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+    return out_path
+
+
+def quantize_onnx(model_path: str, out_path: str) -> str:
+    """
+    Applies ONNX Runtime dynamic int8 quantization to MatMul/Gemm weights.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        model_path,
+        out_path,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=["MatMul", "Gemm"],
+    )
+    return out_path
+
+
+def update_onnx_manifest(
+    out_dir: str, model_name: str, variants: Dict[str, str], options: Dict
+) -> None:
+    """
+    Records exported variants of `model_name` and export options in the manifest of `out_dir`.
+    """
+    manifest_path = Path(out_dir) / ONNX_MANIFEST
+    manifest = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest[model_name] = {
+        "variants": {name: Path(path).name for name, path in variants.items()},
+        **options,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
+def resolve_onnx_path(
+    onnx_dir: str, model_name: str, variant: Optional[str] = None
+) -> str:
+    """
+    Returns the path of the requested variant of `model_name`, or of the most
+    optimized variant listed in the manifest, falling back to `{model_name}.onnx`.
+    """
+    manifest_path = Path(onnx_dir) / ONNX_MANIFEST
+    variants = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        variants = manifest.get(model_name, {}).get("variants", {})
+    if variant is not None:
+        if variant not in variants:
+            raise ValueError(f"No '{variant}' variant of {model_name} in {onnx_dir}")
+        return str(Path(onnx_dir) / variants[variant])
+    for name in ONNX_VARIANTS:
+        if name in variants and (Path(onnx_dir) / variants[name]).exists():
+            return str(Path(onnx_dir) / variants[name])
+    return str(Path(onnx_dir) / f"{model_name}.onnx")
+
+
 def onnx_converter(
     model_name: str,
     module: torch.nn.Module,
@@ -19,7 +107,15 @@ def onnx_converter(
         Union[Dict[str, List[int]], Dict[str, Dict[int, str]]]
     ] = None,
     opset_version: int = 17,
-):
+    optimize: bool = False,
+    quantize: Optional[str] = None,
+    source_sha256: Optional[str] = None,
+) -> Dict[str, str]:
+    """
+    Exports `module` to `{out_dir}/{model_name}.onnx` and, optionally, its
+    int8-quantized and ORT-optimized variants. Returns the variant paths,
+    which are also recorded in the directory manifest.
+    """
     if inputs is None:
         inputs = module.input_example()
     if input_names is None:
@@ -29,7 +125,9 @@ def onnx_converter(
 
     Path(out_dir).mkdir(exist_ok=True, parents=True)
     out_path = str(Path(out_dir) / f"{model_name}.onnx")
-    saved_dtype = next(module.parameters()).dtype
+    # Export in fp32 and restore per-tensor dtypes (e.g. fp16 encoder with fp32 head)
+    saved_dtypes = [param.dtype for param in module.parameters()]
+    saved_buffer_dtypes = [buffer.dtype for buffer in module.buffers()]
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=(UserWarning, TracerWarning))
         torch.onnx.export(
@@ -42,7 +140,114 @@ def onnx_converter(
             opset_version=opset_version,
         )
     print(f"Succesfully ported onnx {model_name} to {out_path}.")
-    module.to(saved_dtype)
+    for param, dtype in zip(module.parameters(), saved_dtypes):
+        param.data = param.data.to(dtype)
+    for buffer, dtype in zip(module.buffers(), saved_buffer_dtypes):
+        buffer.data = buffer.data.to(dtype)
+
+    variants = {"fp32": out_path}
+    if quantize is not None:
+        if quantize != "int8":
+            raise ValueError(f"Unknown onnx quantization '{quantize}'")
+        variants["int8"] = quantize_onnx(
+            out_path, str(Path(out_dir) / f"{model_name}.int8.onnx")
+        )
+    if optimize:
+        for name, path in list(variants.items()):
+            opt_path = str(Path(path).with_suffix(".opt.onnx"))
+            variants[f"{name}_opt"] = optimize_onnx(path, opt_path)
+    if len(variants) > 1:
+        print(f"Saved onnx {model_name} variants: {', '.join(variants)}.")
+
+    update_onnx_manifest(
+        out_dir,
+        model_name,
+        variants,
+        {
+            "opset_version": opset_version,
+            "optimize": optimize,
+            "quantize": quantize,
+            "source_checkpoint_sha256": source_sha256,
+        },
+    )
+    return variants
+
+
+def available_cpus() -> List[int]:
+    """
+    Returns ids of the CPU cores this process is allowed to run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cpus() -> int:
+    """
+    Returns the number of physical cores among the CPUs this process may run on
+    (SMT siblings count once). Falls back to the logical CPU count.
+    """
+    cpus = available_cpus()
+    try:
+        cores = set()
+        for cpu in cpus:
+            topology = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+            with open(f"{topology}/physical_package_id", encoding="utf-8") as f:
+                package = f.read().strip()
+            with open(f"{topology}/core_id", encoding="utf-8") as f:
+                cores.add((package, f.read().strip()))
+        return len(cores) or len(cpus)
+    except OSError:
+        return len(cpus)
+
+
+def threads_per_job(num_jobs: int) -> int:
+    """
+    Returns the intra-op thread budget of one of `num_jobs` concurrent inference jobs
+    (workers, replicas or requests), so that together they use every physical core once.
+    """
+    return max(1, physical_cpus() // max(1, num_jobs))
+
+
+def cpu_supports_bf16() -> bool:
+    """
+    Checks whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX-BF16).
+    """
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = set(line.split(":", 1)[1].split())
+                    return bool(flags & {"avx512_bf16", "amx_bf16"})
+    except OSError:
+        pass
+    return False
+
+
+_PROFILING = False
+
+
+def set_profiling(enabled: bool) -> None:
+    """
+    Enables or disables the named ranges of profile_range; set by the code
+    that starts and stops torch.profiler.
+    """
+    global _PROFILING
+    _PROFILING = enabled
+
+
+def profile_range(name: str) -> contextlib.AbstractContextManager:
+    """
+    Returns a named torch.profiler range, or a no-op context when profiling
+    is not enabled (see set_profiling) or the module is being traced or compiled.
+    """
+    if (
+        not _PROFILING
+        or torch.compiler.is_compiling()
+        or torch.jit.is_tracing()
+    ):
+        return contextlib.nullcontext()
+    return torch.profiler.record_function(name)
 
 
 def format_time(seconds: float) -> str:
@@ -94,7 +299,7 @@ def apply_masked_flash_attn(
     from flash_attn import flash_attn_varlen_func
     from flash_attn.bert_padding import pad_input, unpad_input
 
-    pad_mask = ~mask[:, 0, :]
+    pad_mask = ~mask[:, 0, 0, :]
     b, t = pad_mask.shape
     q = q.view(b, t, h * d_k)
     k = k.view(b, t, h * d_k)
@@ -1,58 +1,101 @@
 import os
+import threading
+import time
 from io import BytesIO
-from typing import List, Tuple, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
 
 import torch
-from pyannote.audio import Pipeline
-from pyannote.audio.pipelines.utils.hook import ProgressHook
-from pydub import AudioSegment
 from torch import Tensor
 
-_PIPELINE = None
+from .energy_vad import energy_vad, split_at_pauses
+from .utils import profile_range
+
+# pyannote.audio and pydub are imported on first use: they are slow to import
+# and not needed until a recording is segmented
+if TYPE_CHECKING:
+    from pyannote.audio import Pipeline
+    from pydub import AudioSegment
+
+VAD_BACKENDS = ["pyannote", "energy"]
+# Pyannote pipelines by short name
+PIPELINES = {
+    "vad": "pyannote/voice-activity-detection",
+    "diarization": "pyannote/speaker-diarization-3.1",
+}
 _SPEAKERS_NUM = 2
 
+# Loaded pipelines keyed by (pipeline name, device); every key has its own lock,
+# so concurrent first requests load a pipeline once without blocking other keys
+_PIPELINES: Dict[Tuple[str, str], "Pipeline"] = {}
+_PIPELINE_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_REGISTRY_LOCK = threading.Lock()
 
-def get_pipeline(device: Union[str, torch.device]) -> Pipeline:
+
+def load_pipeline(name: str, device: Union[str, torch.device]) -> "Pipeline":
     """
-    Retrieves a PyAnnote voice activity detection pipeline and move it to the specified device.
-    The pipeline is loaded only once and reused across subsequent calls.
+    Retrieves a PyAnnote pipeline (a key of `PIPELINES` or a Hugging Face name)
+    on the specified device. Every pipeline is loaded once per device and reused.
     It requires the Hugging Face API token to be set in the HF_TOKEN environment variable.
     """
-    global _PIPELINE
-    if _PIPELINE is not None:
-        return _PIPELINE.to(device)
+    name = PIPELINES.get(name, name)
+    key = (name, str(torch.device(device)))
+    pipeline = _PIPELINES.get(key)
+    if pipeline is not None:
+        return pipeline
 
-    try:
-        hf_token = os.environ["HF_TOKEN"]
-    except KeyError as exc:
-        raise ValueError("HF_TOKEN environment variable is not set") from exc
+    with _REGISTRY_LOCK:
+        lock = _PIPELINE_LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _PIPELINES:
+            try:
+                hf_token = os.environ["HF_TOKEN"]
+            except KeyError as exc:
+                raise ValueError("HF_TOKEN environment variable is not set") from exc
 
-    _PIPELINE = Pipeline.from_pretrained(
-        "pyannote/voice-activity-detection", use_auth_token=hf_token
-    )
-    return _PIPELINE.to(device)
+            from pyannote.audio import Pipeline
 
-def get_pipeline2(device: Union[str, torch.device]) -> Pipeline:
+            pipeline = Pipeline.from_pretrained(name, use_auth_token=hf_token)
+            _PIPELINES[key] = pipeline.to(torch.device(device))
+    return _PIPELINES[key]
+
+
+def get_pipeline(device: Union[str, torch.device]) -> "Pipeline":
     """
-    Retrieves a PyAnnote voice activity detection pipeline and move it to the specified device.
-    The pipeline is loaded only once and reused across subsequent calls.
-    It requires the Hugging Face API token to be set in the HF_TOKEN environment variable.
+    Retrieves a PyAnnote voice activity detection pipeline on the specified device.
     """
-    global _PIPELINE
-    if _PIPELINE is not None:
-        return _PIPELINE.to(device)
+    return load_pipeline("vad", device)
 
-    try:
-        hf_token = os.environ["HF_TOKEN"]
-    except KeyError as exc:
-        raise ValueError("HF_TOKEN environment variable is not set") from exc
 
-    _PIPELINE = Pipeline.from_pretrained(
-        "pyannote/speaker-diarization-3.1", use_auth_token=hf_token
-    )
-    return _PIPELINE.to(device)
+def get_pipeline2(device: Union[str, torch.device]) -> "Pipeline":
+    """
+    Retrieves a PyAnnote speaker diarization pipeline on the specified device.
+    """
+    return load_pipeline("diarization", device)
 
-def audiosegment_to_tensor(audiosegment: AudioSegment) -> torch.Tensor:
+
+def preload_pipelines(
+    names: Sequence[str],
+    device: Union[str, torch.device] = "cpu",
+    warmup: bool = True,
+    sample_rate: int = 16000,
+) -> Dict[str, float]:
+    """
+    Loads the given pipelines and, with `warmup`, runs each once on a short
+    noise signal, so that the first request does not pay for loading and
+    one-time initialization. Returns the time in seconds spent on every pipeline.
+    """
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        pipeline = load_pipeline(name, device)
+        if warmup:
+            waveform = 0.01 * torch.randn(1, 2 * sample_rate)
+            pipeline({"waveform": waveform, "sample_rate": sample_rate})
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def audiosegment_to_tensor(audiosegment: "AudioSegment") -> torch.Tensor:
     """
     Converts an AudioSegment object to a PyTorch tensor.
     """
@@ -64,18 +107,22 @@ def audiosegment_to_tensor(audiosegment: AudioSegment) -> torch.Tensor:
     return samples
 
 
-def segment_audio(
-    wav_tensor: torch.Tensor,
-    sample_rate: int,
-    max_duration: float = 22.0,
-    min_duration: float = 15.0,
-    new_chunk_threshold: float = 0.2,
-    device: Union[str, torch.device] = "cpu",
-) -> Tuple[List[torch.Tensor], List[Tuple[float, float]]]:
+def boundary_to_samples(
+    start: float, end: float, sample_rate: int
+) -> Tuple[int, int]:
     """
-    Segments an audio waveform into smaller chunks based on speech activity.
-    The segmentation is performed using a PyAnnote voice activity detection pipeline.
+    Converts segment boundaries in seconds to sample indices, rounded to whole milliseconds.
     """
+    start_ms = int(start * 1000)
+    end_ms = int(end * 1000)
+    return start_ms * sample_rate // 1000, end_ms * sample_rate // 1000
+
+
+def _wav_bytes(wav_tensor: torch.Tensor, sample_rate: int) -> BytesIO:
+    """
+    Encodes an int16 waveform as an in-memory wav file for the pyannote pipelines.
+    """
+    from pydub import AudioSegment
 
     audio = AudioSegment(
         wav_tensor.numpy().tobytes(),
@@ -86,30 +133,50 @@ def segment_audio(
     audio_bytes = BytesIO()
     audio.export(audio_bytes, format="wav")
     audio_bytes.seek(0)
+    return audio_bytes
 
-    # Process audio with pipeline to obtain segments with speech activity
-    pipeline = get_pipeline(device)
-    sad_segments = pipeline({"uri": "filename", "audio": audio_bytes})
 
+def pyannote_speech(
+    wav_tensor: torch.Tensor,
+    sample_rate: int,
+    device: Union[str, torch.device] = "cpu",
+) -> List[Tuple[float, float]]:
+    """
+    Detects speech regions (in seconds) with the PyAnnote voice activity detection pipeline.
+    """
+    pipeline = get_pipeline(device)
+    with profile_range("vad"):
+        sad_segments = pipeline(
+            {"uri": "filename", "audio": _wav_bytes(wav_tensor, sample_rate)}
+        )
     print(sad_segments)
-    segments: List[torch.Tensor] = []
+    return [
+        (segment.start, segment.end) for segment in sad_segments.get_timeline().support()
+    ]
+
+
+def merge_speech(
+    speech: List[Tuple[float, float]],
+    duration: float,
+    max_duration: float = 22.0,
+    min_duration: float = 15.0,
+    new_chunk_threshold: float = 0.2,
+) -> List[Tuple[float, float]]:
+    """
+    Concatenates speech regions into chunks for ASR: a chunk is closed once it is longer
+    than `min_duration` and followed by a pause over `new_chunk_threshold`,
+    or when the next region would make it longer than `max_duration`.
+    """
+    boundaries: List[Tuple[float, float]] = []
     curr_duration = 0.0
     curr_start = 0.0
     curr_end = 0.0
-    boundaries: List[Tuple[float, float]] = []
-
-    # Concat segments from pipeline into chunks for asr according to max/min duration
-    for segment in sad_segments.get_timeline().support():
-        print(segment)
-        start = max(0, segment.start)
-        end = min(len(audio) / 1000, segment.end)
+    for start, end in speech:
+        start = max(0, start)
+        end = min(duration, end)
         if (
             curr_duration > min_duration and start - curr_end > new_chunk_threshold
         ) or (curr_duration + (end - curr_end) > max_duration):
-
-            start_ms = int(curr_start * 1000)
-            end_ms = int(curr_end * 1000)
-            segments.append(audiosegment_to_tensor(audio[start_ms:end_ms]))
             boundaries.append((curr_start, curr_end))
             curr_start = start
 
@@ -117,13 +184,156 @@ def segment_audio(
         curr_duration = curr_end - curr_start
 
     if curr_duration != 0:
-        start_ms = int(curr_start * 1000)
-        end_ms = int(curr_end * 1000)
-        segments.append(audiosegment_to_tensor(audio[start_ms:end_ms]))
         boundaries.append((curr_start, curr_end))
+    return boundaries
+
+
+def segment_audio(
+    wav_tensor: torch.Tensor,
+    sample_rate: int,
+    max_duration: float = 22.0,
+    min_duration: float = 15.0,
+    new_chunk_threshold: float = 0.2,
+    device: Union[str, torch.device] = "cpu",
+    vad: str = "pyannote",
+) -> Tuple[List[torch.Tensor], List[Tuple[float, float]]]:
+    """
+    Segments an audio waveform into smaller chunks based on speech activity.
+    Speech is detected with a PyAnnote voice activity detection pipeline (`vad="pyannote"`)
+    or with the built-in energy/spectral detector (`vad="energy"`, no model or HF token needed).
+    """
+    if vad not in VAD_BACKENDS:
+        raise ValueError(f"Unknown VAD backend '{vad}'. Available: {VAD_BACKENDS}")
+
+    # Normalize once; segments are views into this tensor
+    wav_float = wav_tensor.float() / 32768.0
+    if vad == "energy":
+        with profile_range("vad"):
+            speech = energy_vad(wav_float, sample_rate)
+    else:
+        speech = pyannote_speech(wav_tensor, sample_rate, device=device)
+
+    boundaries = merge_speech(
+        speech,
+        wav_tensor.shape[-1] / sample_rate,
+        max_duration=max_duration,
+        min_duration=min_duration,
+        new_chunk_threshold=new_chunk_threshold,
+    )
+    segments: List[torch.Tensor] = []
+    for start, end in boundaries:
+        start_idx, end_idx = boundary_to_samples(start, end, sample_rate)
+        segments.append(wav_float[start_idx:end_idx])
 
     return segments, boundaries
 
+def pyannote_turns(
+    wav_tensor: torch.Tensor,
+    sample_rate: int,
+    device: Union[str, torch.device] = "cpu",
+) -> List[Tuple[float, float, str]]:
+    """
+    Detects speaker turns (start, end in seconds, speaker label)
+    with the PyAnnote speaker diarization pipeline.
+    """
+    from pyannote.audio.pipelines.utils.hook import ProgressHook
+
+    audio_bytes = _wav_bytes(wav_tensor, sample_rate)
+    pipeline = get_pipeline2(device)
+    with ProgressHook() as hook, profile_range("diarization"):
+        diarization = pipeline({"uri": "filename", "audio": audio_bytes}, hook=hook)
+    print(diarization)
+    return [
+        (turn.start, turn.end, speaker)
+        for turn, _, speaker in diarization.itertracks(yield_label=True)
+    ]
+
+
+def merge_turns(
+    turns: List[Tuple[float, float, str]],
+    duration: float,
+    max_duration: float = 22.0,
+    min_duration: float = 15.0,
+    new_chunk_threshold: float = 0.2,
+    min_turn_duration: float = 0.5,
+    attach_gap: float = 1.0,
+) -> List[Tuple[float, float, str]]:
+    """
+    Concatenates speaker turns into chunks for ASR.
+    Consecutive turns of the same speaker are merged the way `merge_speech` merges
+    speech regions (up to `max_duration`, splitting at pauses over `new_chunk_threshold`
+    once the chunk is longer than `min_duration`).
+    Overlapping turns are trimmed to start where the previous chunk ends, so no audio
+    is transcribed twice. Turns shorter than `min_turn_duration` are attached to the
+    previous or the next chunk of the same speaker if it is within `attach_gap`,
+    and dropped otherwise, so no audio is labelled with another speaker.
+    """
+    chunks: List[List] = []
+    for start, end, speaker in sorted(turns):
+        start = max(0, start)
+        end = min(duration, end)
+        if chunks:
+            prev = chunks[-1]
+            start = max(start, prev[1])
+            if end <= start:
+                # Turn lies within the previous chunk
+                continue
+            gap = start - prev[1]
+            fits = end - prev[0] <= max_duration
+            same_speaker = speaker == prev[2] and (
+                prev[1] - prev[0] <= min_duration or gap <= new_chunk_threshold
+            )
+            short_turn = (
+                speaker == prev[2] and end - start < min_turn_duration and gap <= attach_gap
+            )
+            if fits and (same_speaker or short_turn):
+                prev[1] = end
+                continue
+        chunks.append([start, end, speaker])
+
+    # Chunks still too short: attach to the next chunk of the same speaker or drop
+    merged: List[Tuple[float, float, str]] = []
+    for i, (start, end, speaker) in enumerate(chunks):
+        if end - start >= min_turn_duration:
+            merged.append((start, end, speaker))
+            continue
+        if i + 1 < len(chunks):
+            next_chunk = chunks[i + 1]
+            if (
+                next_chunk[2] == speaker
+                and next_chunk[0] - end <= attach_gap
+                and next_chunk[1] - start <= max_duration
+            ):
+                next_chunk[0] = start
+    return merged
+
+
+def assign_speakers(
+    boundaries: List[Tuple[float, float]], turns: List[Tuple[float, float, str]]
+) -> List[Optional[str]]:
+    """
+    Labels every segment with the speaker whose diarization turns overlap it the most,
+    or the speaker of the nearest turn if none overlaps. None if there are no turns.
+    """
+    speakers: List[Optional[str]] = []
+    for start, end in boundaries:
+        overlaps: Dict[str, float] = {}
+        for turn_start, turn_end, speaker in turns:
+            overlap = min(end, turn_end) - max(start, turn_start)
+            if overlap > 0:
+                overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+        if overlaps:
+            speakers.append(max(overlaps, key=overlaps.get))
+        elif turns:
+            nearest = min(
+                turns, key=lambda turn: max(turn[0] - end, start - turn[1])
+            )
+            speakers.append(nearest[2])
+        else:
+            speakers.append(None)
+    return speakers
+
+
 def segment_audio_by_speakers(
         wav_tensor: torch.Tensor,
         sample_rate: int,
@@ -131,42 +341,46 @@ def segment_audio_by_speakers(
         min_duration: float = 0,
         new_chunk_threshold: float = 0.2,
         device: Union[str, torch.device] = "cpu",
-) -> tuple[list[Tensor], list[tuple[float, float]], list[tuple[str]]]:
+        min_turn_duration: float = 0.5,
+        return_turn_ids: bool = False,
+) -> Union[
+    Tuple[List[Tensor], List[Tuple[float, float]], List[str]],
+    Tuple[List[Tensor], List[Tuple[float, float]], List[str], List[int]],
+]:
     """
     Segments an audio waveform into chunks based on different speakers.
-    The segmentation is performed using a PyAnnote speaker diarization pipeline.
+    The segmentation is performed using a PyAnnote speaker diarization pipeline;
+    turns are concatenated into chunks with `merge_turns`. Chunks longer than
+    `max_duration` (a single long turn) are split at low-energy points into pieces
+    that keep the speaker label; with `return_turn_ids`, the index of the chunk
+    every piece belongs to is returned as well.
     """
-
-    audio = AudioSegment(
-        wav_tensor.numpy().tobytes(),
-        frame_rate=sample_rate,
-        sample_width=wav_tensor.dtype.itemsize,
-        channels=1,
+    turns = pyannote_turns(wav_tensor, sample_rate, device=device)
+    chunks = merge_turns(
+        turns,
+        wav_tensor.shape[-1] / sample_rate,
+        max_duration=max_duration,
+        min_duration=min_duration,
+        new_chunk_threshold=new_chunk_threshold,
+        min_turn_duration=min_turn_duration,
     )
-    audio_bytes = BytesIO()
-    audio.export(audio_bytes, format="wav")
-    audio_bytes.seek(0)
-
-    # Process audio with pipeline to obtain segments with speech activity
-    pipeline = get_pipeline2(device)
-    with ProgressHook() as hook:
-        sad_segments = pipeline({"uri": "filename", "audio": audio_bytes}, hook=hook)
-    print(sad_segments)
 
+    wav_float = wav_tensor.float() / 32768.0
     segments: List[torch.Tensor] = []
     boundaries: List[Tuple[float, float]] = []
-    speakers: List[Tuple[str]] = []
-
-    # Concat segments from pipeline into chunks for asr according to max/min duration
-    for turn, _, speaker in sad_segments.itertracks(yield_label=True):
-        print(turn)
-        start = max(0, turn.start)
-        end = min(len(audio) / 1000, turn.end)
-        start_ms = int(start * 1000)
-        end_ms = int(end * 1000)
-        if end_ms - start_ms > 500:
-            segments.append(audiosegment_to_tensor(audio[start_ms:end_ms]))
-            boundaries.append((start, end))
+    speakers: List[str] = []
+    turn_ids: List[int] = []
+    for turn_id, (start, end, speaker) in enumerate(chunks):
+        start_idx, end_idx = boundary_to_samples(start, end, sample_rate)
+        turn = wav_float[start_idx:end_idx]
+        for piece_start, piece_end in split_at_pauses(turn, sample_rate, max_duration):
+            segments.append(turn[piece_start:piece_end])
+            boundaries.append(
+                (start + piece_start / sample_rate, start + piece_end / sample_rate)
+            )
             speakers.append(speaker)
+            turn_ids.append(turn_id)
 
+    if return_turn_ids:
+        return segments, boundaries, speakers, turn_ids
     return segments, boundaries, speakers
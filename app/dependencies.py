@@ -1,14 +1,202 @@
 import os
-from GigaAM import gigaam
+import threading
 from dotenv import load_dotenv
 
+from core.executor import InferenceExecutor
+
 load_dotenv()
 
-MODEL_NAME = "v2_rnnt"
+MODEL_NAME = os.getenv("MODEL_NAME", "v2_rnnt")
+# Бэкенд инференса ASR: "torch" или "onnx" (ONNX Runtime на CPU)
+ASR_BACKEND = os.getenv("ASR_BACKEND", "torch")
+# Квантизация torch-модели на CPU: пусто или "int8"; ASR_QUANTIZE_JOINT=true квантует и joint RNN-T
+ASR_QUANTIZE = os.getenv("ASR_QUANTIZE") or None
+ASR_QUANTIZE_JOINT = os.getenv("ASR_QUANTIZE_JOINT", "false").lower() == "true"
+# bfloat16 autocast на CPU (включается только при аппаратной поддержке AVX512-BF16/AMX)
+ASR_BF16_CPU = os.getenv("ASR_BF16_CPU", "false").lower() == "true"
+# Компиляция энкодера с бакетами по длине: пусто, "compile" (torch.compile) или "script" (TorchScript)
+ASR_COMPILE = os.getenv("ASR_COMPILE") or None
+# Число процессов-воркеров torch-модели на CPU: сегменты записи распознаются параллельно,
+# веса разделяются через mmap сконвертированного чекпоинта; потоков на воркер - физические ядра / воркеры
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "0"))
+# Загрузка модели в фоне при старте приложения (иначе - при первом запросе распознавания)
+ASR_PRELOAD = os.getenv("ASR_PRELOAD", "true").lower() == "true"
+# Прогрев модели после загрузки
+ASR_WARMUP = os.getenv("ASR_WARMUP", "true").lower() == "true"
+# Каталог с ONNX-моделями; при отсутствии файлов они экспортируются из чекпоинта
+ONNX_DIR = os.getenv("ONNX_DIR", os.path.expanduser("~/.cache/gigaam/onnx"))
+# Пул сессий ONNX Runtime: число реплик (по умолчанию ASR_CONCURRENCY), потоков на реплику
+# (по умолчанию бюджет потоков задачи, см. ASR_THREADS_PER_JOB) и закрепление потоков
+# реплики за своим набором ядер
+ONNX_REPLICAS = int(os.getenv("ONNX_REPLICAS", "0")) or None
+ONNX_THREADS_PER_REPLICA = int(os.getenv("ONNX_THREADS_PER_REPLICA", "0")) or None
+ONNX_PIN_CORES = os.getenv("ONNX_PIN_CORES", "false").lower() == "true"
+# Постобработка ONNX при экспорте: оптимизация графа ORT и INT8-квантизация ("int8")
+ONNX_OPTIMIZE = os.getenv("ONNX_OPTIMIZE", "false").lower() == "true"
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE") or None
+# Лог-мел признаки считаются один раз на всю запись и нарезаются по сегментам
+ASR_PRECOMPUTE_FEATURES = os.getenv("ASR_PRECOMPUTE_FEATURES", "false").lower() == "true"
+# Распознавание эмоций по сегментам (модель загружается при первом запросе с emotions=true)
+EMO_BATCH_SIZE = int(os.getenv("EMO_BATCH_SIZE", "8"))
+# Пайплайны pyannote, загружаемые и прогреваемые при старте: "vad", "diarization" через запятую
+PYANNOTE_PRELOAD = [name.strip() for name in os.getenv("PYANNOTE_PRELOAD", "").split(",") if name.strip()]
+# Удалённые воркеры распознавания (python -m app.worker) через запятую, например
+# "http://10.0.0.2:9001,http://10.0.0.3:9001". Если заданы, модель в процессе API не загружается
+INFERENCE_WORKERS = [url.strip() for url in os.getenv("INFERENCE_WORKERS", "").split(",") if url.strip()]
+# Повторы запроса на других воркерах и интервал проверки /health (с)
+INFERENCE_RETRIES = int(os.getenv("INFERENCE_RETRIES", "2"))
+INFERENCE_HEALTH_INTERVAL = float(os.getenv("INFERENCE_HEALTH_INTERVAL", "10"))
+# Время ожидания ответа воркера (с); должно превышать распознавание самого длинного файла
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "3600"))
 HF_TOKEN = os.getenv("HF_TOKEN")
-os.environ["HF_TOKEN"] = HF_TOKEN
+if HF_TOKEN:
+    os.environ["HF_TOKEN"] = HF_TOKEN
+
+
+# Потоков torch/ORT (intra-op) и ffmpeg на одну задачу распознавания; по умолчанию
+# физические ядра / ASR_CONCURRENCY, чтобы одновременные задачи не конкурировали за ядра
+ASR_THREADS_PER_JOB = int(os.getenv("ASR_THREADS_PER_JOB", "0")) or None
+
+
+def threads_per_job() -> int:
+    if ASR_THREADS_PER_JOB:
+        return ASR_THREADS_PER_JOB
+    from GigaAM.gigaam.utils import threads_per_job as cpu_threads_per_job
+    return cpu_threads_per_job(ASR_CONCURRENCY)
+
+
+def configure_cpu_budget() -> int:
+    # Пул intra-op torch задаётся на каждый вызывающий поток, поэтому
+    # ASR_CONCURRENCY задач x threads потоков ~ физические ядра; inter-op параллелизм не используется
+    import torch
+    from GigaAM.gigaam.preprocess import set_ffmpeg_threads
+
+    threads = threads_per_job()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Пул inter-op уже запущен: число его потоков изменить нельзя
+        pass
+    set_ffmpeg_threads(threads)
+    print(f"[startup] Бюджет CPU: {ASR_CONCURRENCY} задач x {threads} потоков")
+    return threads
+
+
+def load_asr_model():
+    if INFERENCE_WORKERS:
+        from app.dispatcher import WorkerDispatcher
+        return WorkerDispatcher(
+            INFERENCE_WORKERS,
+            timeout=INFERENCE_TIMEOUT,
+            retries=INFERENCE_RETRIES,
+            health_interval=INFERENCE_HEALTH_INTERVAL,
+        )
+
+    # torch и GigaAM импортируются только при загрузке модели
+    from GigaAM import gigaam
 
-model = gigaam.load_model(MODEL_NAME)
+    threads = configure_cpu_budget()
+
+    if ASR_BACKEND == "torch" and ASR_WORKERS > 0:
+        from GigaAM.gigaam.sharding import ShardedTranscriber
+        return ShardedTranscriber(
+            MODEL_NAME,
+            ASR_WORKERS,
+            quantize=ASR_QUANTIZE,
+            quantize_joint=ASR_QUANTIZE_JOINT,
+            bf16_cpu=ASR_BF16_CPU,
+        )
+    if ASR_BACKEND == "torch":
+        asr_model = gigaam.load_model(
+            MODEL_NAME,
+            quantize=ASR_QUANTIZE,
+            quantize_joint=ASR_QUANTIZE_JOINT,
+            bf16_cpu=ASR_BF16_CPU,
+        )
+        if ASR_COMPILE:
+            asr_model.compile_encoder(mode=ASR_COMPILE)
+        return asr_model
+    if ASR_BACKEND == "onnx":
+        from GigaAM.gigaam.onnx_utils import load_onnx_model
+        return load_onnx_model(
+            MODEL_NAME,
+            ONNX_DIR,
+            num_replicas=ONNX_REPLICAS or ASR_CONCURRENCY,
+            threads_per_replica=ONNX_THREADS_PER_REPLICA or threads,
+            pin_cores=ONNX_PIN_CORES,
+            optimize=ONNX_OPTIMIZE,
+            quantize=ONNX_QUANTIZE,
+        )
+    raise ValueError(f"Unknown ASR_BACKEND '{ASR_BACKEND}', expected 'torch' or 'onnx'")
+
+
+# VAD без диаризации: "pyannote" (нейросетевой пайплайн) или "energy" (встроенный, без модели и HF_TOKEN)
+ASR_VAD = os.getenv("ASR_VAD", "pyannote")
+# Диаризация параллельно с распознаванием сегментов VAD; спикеры назначаются по пересечению во времени
+ASR_PIPELINE_DIARIZATION = os.getenv("ASR_PIPELINE_DIARIZATION", "false").lower() == "true"
+
+# Каталог контрольных точек длинных записей: сегментация и готовые сегменты сохраняются по мере
+# распознавания, и повторная отправка того же файла после сбоя продолжает работу с места остановки
+ASR_JOB_DIR = os.getenv("ASR_JOB_DIR") or None
+
+# Параметры transcribe_longform, передаваемые в каждый запрос распознавания
+LONGFORM_OPTIONS = {
+    "precompute_features": ASR_PRECOMPUTE_FEATURES,
+    "vad": ASR_VAD,
+    "pipeline_diarization": ASR_PIPELINE_DIARIZATION,
+}
+if ASR_JOB_DIR:
+    LONGFORM_OPTIONS["job_dir"] = ASR_JOB_DIR
+
+# Пакетное распознавание (/transcribe/batch): размер общего батча сегментов
+# и число потоков декодирования (ffmpeg) и сегментации файлов
+BATCH_OPTIONS = {
+    "batch_size": int(os.getenv("ASR_BATCH_SIZE", "8")),
+    "decode_workers": int(os.getenv("ASR_DECODE_WORKERS", "4")),
+}
+
+# Очередь распознавания: число одновременных задач, из них не более ASR_BULK_SLOTS
+# для класса bulk (по умолчанию на одну меньше), чтобы короткие интерактивные записи
+# (до ASR_INTERACTIVE_MAX_SECONDS) не ждали завершения длинных
+ASR_CONCURRENCY = int(os.getenv("ASR_CONCURRENCY", "2"))
+# Мест в очереди и потоков выделенного пула распознавания: локально - ASR_CONCURRENCY
+# (бюджет CPU), с удалёнными воркерами - ASR_CONCURRENCY на воркер: здесь запросы
+# только ожидают ответа, а распознают воркеры со своим бюджетом
+INFERENCE_SLOTS = ASR_CONCURRENCY * max(1, len(INFERENCE_WORKERS))
+INFERENCE_EXECUTOR = InferenceExecutor(INFERENCE_SLOTS)
+ASR_BULK_SLOTS = int(os.getenv("ASR_BULK_SLOTS", "0")) or None
+ASR_INTERACTIVE_MAX_SECONDS = float(os.getenv("ASR_INTERACTIVE_MAX_SECONDS", "120"))
+# Токен администратора (заголовок X-Admin-Token): просмотр и отмена задач всех сессий
+JOBS_ADMIN_TOKEN = os.getenv("JOBS_ADMIN_TOKEN") or None
+
+model = None
+_model_lock = threading.Lock()
+emo_model = None
+_emo_lock = threading.Lock()
 
 def get_model():
-    return model
\ No newline at end of file
+    global model
+    with _model_lock:
+        if model is None:
+            model = load_asr_model()
+    return model
+
+def get_emo_model():
+    global emo_model
+    # При удалённых воркерах эмоции распознаёт модель воркера, здесь - только признак запроса
+    if INFERENCE_WORKERS:
+        return "remote"
+    with _emo_lock:
+        if emo_model is None:
+            from GigaAM import gigaam
+            emo_model = gigaam.load_model("emo")
+    return emo_model
+
+def preload_pipelines():
+    # Пайплайны загружаются на то же устройство, которое transcribe_longform передаёт в vad_utils
+    import torch
+    from GigaAM.gigaam.vad_utils import preload_pipelines as preload
+
+    device = "cuda" if ASR_BACKEND == "torch" and torch.cuda.is_available() else "cpu"
+    return preload(PYANNOTE_PRELOAD, device=device)
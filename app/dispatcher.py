@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import httpx
+
+from core.scheduler import JobCancelled
+
+# Коды ответа воркера, при которых запрос повторяется на другом воркере
+RETRY_STATUSES = {502, 503, 504}
+
+
+class NoHealthyWorkers(RuntimeError):
+    pass
+
+
+class WorkerTimeout(RuntimeError):
+    pass
+
+
+class _Worker:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.in_flight = 0
+        self.failures = 0
+
+
+class WorkerDispatcher:
+    """
+    Распределяет распознавание по удалённым воркерам (app.worker) по HTTP.
+    Запрос уходит на здоровый воркер с наименьшим числом выполняемых запросов;
+    при сетевой ошибке или 502/503/504 воркер помечается нездоровым, а запрос
+    повторяется на другом. Фоновая проверка /health возвращает воркеры в работу.
+    Ответ, не полученный за timeout секунд, не повторяется: воркер занят, а не недоступен,
+    и продолжает распознавание.
+    Предоставляет transcribe_longform, как модели GigaAM, поэтому подставляется
+    в process_audio вместо локальной модели.
+    """
+
+    def __init__(
+            self,
+            urls: List[str],
+            timeout: float = 3600.0,
+            retries: int = 2,
+            health_interval: float = 10.0,
+    ):
+        if not urls:
+            raise ValueError("No inference workers configured")
+        self.workers = [_Worker(url) for url in urls]
+        self.retries = retries
+        self.health_interval = health_interval
+        self._client = httpx.Client(timeout=httpx.Timeout(timeout, connect=5.0))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stopped = threading.Event()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    # --- балансировка ---
+
+    def _acquire(self, exclude: set) -> _Worker:
+        with self._lock:
+            candidates = [w for w in self.workers if w.healthy and w.url not in exclude]
+            if not candidates:
+                # Все помечены нездоровыми: пробуем любой ещё не опрошенный воркер
+                candidates = [w for w in self.workers if w.url not in exclude]
+            if not candidates:
+                raise NoHealthyWorkers("No inference workers available")
+            # Среди равно загруженных - по кругу
+            self._next += 1
+            offset = self._next % len(candidates)
+            candidates = candidates[offset:] + candidates[:offset]
+            worker = min(candidates, key=lambda w: w.in_flight)
+            worker.in_flight += 1
+            return worker
+
+    def _release(self, worker: _Worker, ok: bool) -> None:
+        with self._lock:
+            worker.in_flight -= 1
+            if ok:
+                worker.failures = 0
+            else:
+                worker.failures += 1
+                worker.healthy = False
+
+    def _post(self, path: str, **kwargs) -> Dict:
+        tried = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            try:
+                worker = self._acquire(tried)
+            except NoHealthyWorkers:
+                break
+            tried.add(worker.url)
+            try:
+                response = self._client.post(worker.url + path, **kwargs)
+            except httpx.ReadTimeout:
+                # Воркер принял запрос и ещё распознаёт: повтор только удвоил бы работу
+                self._release(worker, ok=True)
+                raise WorkerTimeout(
+                    f"Worker {worker.url} did not respond within {self._client.timeout.read} s"
+                )
+            except httpx.TransportError as e:
+                self._release(worker, ok=False)
+                last_error = e
+                print(f"[dispatcher] Воркер {worker.url} недоступен: {e}")
+                continue
+            if response.status_code in RETRY_STATUSES:
+                self._release(worker, ok=False)
+                last_error = RuntimeError(f"{worker.url}: HTTP {response.status_code}")
+                continue
+            self._release(worker, ok=True)
+            if response.status_code != 200:
+                # Ошибка обработки (например, повреждённый файл) не повторяется на других воркерах
+                raise RuntimeError(f"Worker {worker.url} error: {response.text}")
+            return response.json()
+        raise NoHealthyWorkers(f"All inference workers failed: {last_error}")
+
+    # --- проверка здоровья ---
+
+    def check_health(self) -> Dict[str, bool]:
+        status = {}
+        for worker in self.workers:
+            try:
+                response = self._client.get(worker.url + "/health", timeout=5.0)
+                healthy = response.status_code == 200
+            except httpx.TransportError:
+                healthy = False
+            with self._lock:
+                if healthy and not worker.healthy:
+                    print(f"[dispatcher] Воркер {worker.url} снова доступен")
+                worker.healthy = healthy
+            status[worker.url] = healthy
+        return status
+
+    def _health_loop(self) -> None:
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
+
+    def warmup(self, timeout: float = 600.0) -> Dict[str, float]:
+        """
+        Ожидает, пока все воркеры загрузят модель. Возвращает время готовности каждого.
+        """
+        start = time.perf_counter()
+        ready: Dict[str, float] = {}
+        while len(ready) < len(self.workers) and time.perf_counter() - start < timeout:
+            for url, healthy in self.check_health().items():
+                if healthy and url not in ready:
+                    ready[url] = time.perf_counter() - start
+            if len(ready) < len(self.workers):
+                time.sleep(1.0)
+        return ready
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._client.close()
+
+    # --- распознавание ---
+
+    def transcribe_longform(
+            self,
+            wav_file: str,
+            use_speaker_diarization: bool = False,
+            emo_model=None,
+            **kwargs,
+    ) -> List[Dict]:
+        # Эмоции распознаёт модель воркера; emo_model здесь - только признак запроса
+        kwargs.pop("emo_batch_size", None)
+        # Отмена проверяется до отправки: запущенное на воркере распознавание не прерывается
+        cancel = kwargs.pop("cancel", None)
+        if cancel is not None and cancel.is_set():
+            raise JobCancelled("Transcription cancelled")
+        options = dict(
+            kwargs,
+            use_speaker_diarization=use_speaker_diarization,
+            emotions=emo_model is not None,
+        )
+        with open(wav_file, "rb") as f:
+            content = f.read()
+        result = self._post(
+            "/transcribe_file",
+            files={"file": (os.path.basename(wav_file), content)},
+            data={"options": json.dumps(options)},
+        )
+        for utterance in result["utterances"]:
+            utterance["boundaries"] = tuple(utterance["boundaries"])
+        return result["utterances"]
+
+    def transcribe_segment(self, segment) -> str:
+        body = segment.float().contiguous().numpy().tobytes()
+        return self._post(
+            "/transcribe_segment",
+            content=body,
+            headers={"Content-Type": "application/octet-stream"},
+        )["transcription"]
+
+    def transcribe_segments(self, segments) -> List[str]:
+        """
+        Распознаёт сегменты параллельно на всех воркерах, сохраняя порядок.
+        """
+        with ThreadPoolExecutor(max_workers=2 * len(self.workers)) as executor:
+            return list(executor.map(self.transcribe_segment, segments))
+
+    def transcribe_files(
+            self,
+            wav_files: List[str],
+            batch_size: int = 8,
+            decode_workers: int = 4,
+            **kwargs,
+    ) -> Iterator[Tuple[int, Union[List[Dict], Exception]]]:
+        """
+        Распределяет файлы по воркерам (по два запроса на воркер одновременно)
+        и возвращает (индекс файла, результат или исключение) по мере готовности.
+        Батчи энкодера формируются на воркерах в пределах одного файла.
+        """
+        executor = ThreadPoolExecutor(max_workers=2 * len(self.workers))
+        try:
+            # Файлы, не отправленные до отмены (kwargs["cancel"]), завершаются ошибкой
+            futures = {
+                executor.submit(self.transcribe_longform, path, **kwargs): i
+                for i, path in enumerate(wav_files)
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+        finally:
+            executor.shutdown(cancel_futures=True)
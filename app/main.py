@@ -1,33 +1,69 @@
-import os
 import asyncio
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import time
 import uvicorn
 
 from app.routes import create_router
-from GigaAM import gigaam
+from app.dependencies import (
+    get_model, get_emo_model, preload_pipelines,
+    ASR_BULK_SLOTS, ASR_INTERACTIVE_MAX_SECONDS, ASR_PRELOAD, ASR_WARMUP,
+    BATCH_OPTIONS, EMO_BATCH_SIZE, INFERENCE_EXECUTOR, INFERENCE_SLOTS, JOBS_ADMIN_TOKEN,
+    LONGFORM_OPTIONS, PYANNOTE_PRELOAD,
+)
 from core.ai_chat import cleanup_expired_sessions
+from core.scheduler import PriorityGate
 
-# Загрузка переменных окружения и инициализация модели
+# Загрузка переменных окружения (модель загружается лениво в app.dependencies)
 load_dotenv()
-os.environ["HF_TOKEN"] = os.getenv("HF_TOKEN")
 
-MODEL_NAME = "v2_rnnt"
-model = gigaam.load_model(MODEL_NAME)
+# Фоновая загрузка и прогрев модели: сервер отвечает на запросы, не требующие ASR, сразу.
+# Загрузка идёт в общем пуле, чтобы не занимать места пула распознавания INFERENCE_EXECUTOR
+async def preload_asr_model():
+    start = time.perf_counter()
+    try:
+        model = await run_in_threadpool(get_model)
+    except Exception as e:
+        # Повторная попытка загрузки будет при первом запросе распознавания
+        print(f"[startup] Ошибка загрузки модели: {e}")
+        return
+    print(f"[startup] Модель загружена за {time.perf_counter() - start:.1f} с")
+    if ASR_WARMUP:
+        start = time.perf_counter()
+        timings = await run_in_threadpool(model.warmup)
+        print(f"[warmup] Модель прогрета за {time.perf_counter() - start:.1f} с: {timings}")
+
+# Фоновая загрузка и прогрев пайплайнов pyannote из PYANNOTE_PRELOAD
+async def preload_pyannote():
+    try:
+        timings = await run_in_threadpool(preload_pipelines)
+        print(f"[warmup] Пайплайны pyannote загружены и прогреты: {timings}")
+    except Exception as e:
+        print(f"[startup] Ошибка загрузки пайплайнов pyannote: {e}")
+
+async def preload_models():
+    if ASR_PRELOAD:
+        await preload_asr_model()
+    if PYANNOTE_PRELOAD:
+        await preload_pyannote()
 
 # Lifespan-контекст
 @asynccontextmanager
 async def app_lifespan(app_: FastAPI):
-    task = asyncio.create_task(session_cleaner_loop())
+    tasks = [
+        asyncio.create_task(session_cleaner_loop()),
+        asyncio.create_task(preload_models()),
+    ]
     yield
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        print("[session_cleaner] Остановлена фоновая задача")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    INFERENCE_EXECUTOR.shutdown()
+    print("[lifespan] Остановлены фоновые задачи")
 
 # Создаём FastAPI-приложение
 app = FastAPI(title="Legal Ally API", lifespan=app_lifespan)
@@ -51,7 +87,19 @@ async def limit_upload_size(request: Request, call_next):
     return await call_next(request)
 
 # Роуты
-app.include_router(create_router(model))
+app.include_router(
+    create_router(
+        get_model,
+        LONGFORM_OPTIONS,
+        get_emo_model=get_emo_model,
+        emo_batch_size=EMO_BATCH_SIZE,
+        batch_options=BATCH_OPTIONS,
+        gate=PriorityGate(INFERENCE_SLOTS, bulk_limit=ASR_BULK_SLOTS),
+        interactive_max_seconds=ASR_INTERACTIVE_MAX_SECONDS,
+        executor=INFERENCE_EXECUTOR,
+        jobs_admin_token=JOBS_ADMIN_TOKEN,
+    )
+)
 
 # Задача очистки устаревших сессий
 async def session_cleaner_loop():
@@ -1,16 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import json
 import os
+import secrets
+import shutil
 import tempfile
-from typing import List, Dict
+import zipfile
+from typing import Callable, List, Dict, Optional, Tuple
 
 from pydantic import BaseModel
 
 from core.ai_chat import ask_question, load_chat_session_audio, load_chat_session_documents
 from core.compliance import check_230_fz
+from core.executor import InferenceExecutor
+from core.scheduler import JobCancelled, JobRegistry, PriorityGate, choose_lane, run_cancellable
 from core.summarizer import summarize
-from core.transcriber import process_audio
+from core.transcriber import process_audio, process_audio_batch
 from core.schemas import TranscriptSegment, PDFPage
 from utils.docs_loader import load_pdfs
+from utils.profiler import new_profile_id, is_valid_profile_id, trace_path, summary_path
+
+
+AUDIO_EXTENSIONS = (".wav", ".m4a", ".mp3")
+# HTTP-статус отменённого запроса (клиент отключился или задача отменена через DELETE /jobs/{id})
+CANCELLED_STATUS = 499
+# Ограничения архива пакетного распознавания (защита от zip-бомб)
+MAX_ARCHIVE_FILES = 10000
+MAX_ARCHIVE_SIZE = 2 * 1024 * 1024 * 1024
+
+
+def extract_audio_archive(archive_path: str, target_dir: str) -> List[Tuple[str, str]]:
+    """
+    Распаковывает аудиофайлы из zip-архива. Возвращает пары (имя в архиве, путь).
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(AUDIO_EXTENSIONS)
+        ]
+        if len(members) > MAX_ARCHIVE_FILES:
+            raise HTTPException(400, detail=f"Too many files in archive. Max {MAX_ARCHIVE_FILES}")
+        if sum(info.file_size for info in members) > MAX_ARCHIVE_SIZE:
+            raise HTTPException(400, detail="Archive is too large when unpacked")
+
+        files = []
+        for i, info in enumerate(members):
+            # Имена из архива не используются как пути
+            path = os.path.join(target_dir, f"{i}{os.path.splitext(info.filename)[1].lower()}")
+            with archive.open(info) as source, open(path, "wb") as output:
+                shutil.copyfileobj(source, output)
+            files.append((info.filename, path))
+    return files
 
 
 class LoadAudioChatRequest(BaseModel):
@@ -25,23 +67,73 @@ class AskChatRequest(BaseModel):
     session_id: str
     question: str
 
-def create_router(model):
+def create_router(
+        get_model: Callable,
+        longform_options: Optional[Dict] = None,
+        get_emo_model: Optional[Callable] = None,
+        emo_batch_size: int = 8,
+        batch_options: Optional[Dict] = None,
+        gate: Optional[PriorityGate] = None,
+        interactive_max_seconds: float = 120.0,
+        executor: Optional[InferenceExecutor] = None,
+        jobs_admin_token: Optional[str] = None,
+):
+    longform_options = longform_options or {}
+    batch_options = batch_options or {}
+    gate = gate or PriorityGate(max_concurrent=2)
+    # Распознавание выполняется в выделенном пуле, а не в общем пуле Starlette;
+    # ленивая загрузка моделей - в общем пуле, чтобы не занимать места распознавания
+    executor = executor or InferenceExecutor(gate.max_concurrent)
+    jobs = JobRegistry()
+
     router = APIRouter()
 
+    def register_job(lane: str, job_id: Optional[str], session_id: Optional[str]):
+        try:
+            return jobs.register(lane, job_id, owner=session_id)
+        except ValueError as e:
+            raise HTTPException(409, detail=str(e))
+
+    def jobs_owner(session_id: Optional[str], admin_token: Optional[str]) -> Optional[str]:
+        """
+        Сессия, задачи которой видит клиент; None - все задачи (для администратора).
+        """
+        if jobs_admin_token and admin_token and secrets.compare_digest(admin_token, jobs_admin_token):
+            return None
+        if not session_id:
+            raise HTTPException(401, detail="X-Session-Id header is required")
+        return session_id
+
     @router.post(
         "/transcribe",
         response_model=Dict[str, List[TranscriptSegment]],
         response_model_exclude_none=True
     )
     async def transcribe_audio(
+            request: Request,
+            response: Response,
             file: UploadFile = File(...),
             diarize: bool = Query(True),
-            grammar: bool = Query(True)
+            grammar: bool = Query(True),
+            emotions: bool = Query(False),
+            profile: bool = Query(False),
+            priority: Optional[str] = Query(None),
+            x_profile: Optional[str] = Header(None),
+            x_job_id: Optional[str] = Header(None),
+            x_session_id: Optional[str] = Header(None),
     ):
         # Validate file format
         if not file.filename.lower().endswith((".wav", ".m4a", ".mp3")):
             raise HTTPException(400, detail="Unsupported file format")
 
+        model = await run_in_threadpool(get_model)
+        options = dict(longform_options)
+        if emotions:
+            if get_emo_model is None:
+                raise HTTPException(400, detail="Emotion recognition is not available")
+            options["emo_model"] = await run_in_threadpool(get_emo_model)
+            options["emo_batch_size"] = emo_batch_size
+
         # Save upload to a temporary file
         suffix = os.path.splitext(file.filename)[1]
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
@@ -49,15 +141,166 @@ def create_router(model):
             tmp.write(content)
             tmp_path = tmp.name
 
+        profile_id = new_profile_id(profile or x_profile in ("1", "true"))
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
+
+        job = None
         try:
-            result = await process_audio(tmp_path, model, diarize, grammar)
+            # Короткие записи - в интерактивный класс, длинные - в bulk (или явно через priority)
+            try:
+                lane = await run_in_threadpool(
+                    choose_lane, tmp_path, priority, interactive_max_seconds
+                )
+            except ValueError as e:
+                raise HTTPException(400, detail=str(e))
+            job = register_job(lane, x_job_id, x_session_id)
+            response.headers["X-Job-Id"] = job.id
+
+            result = await run_cancellable(
+                process_audio(
+                    tmp_path, model, diarize, grammar,
+                    profile_id=profile_id, job=job, gate=gate, executor=executor, **options
+                ),
+                job,
+                request.is_disconnected,
+            )
             return result
+        except HTTPException:
+            raise
+        except JobCancelled:
+            raise HTTPException(CANCELLED_STATUS, detail="Request cancelled")
         except Exception as e:
             raise HTTPException(500, detail=f"Processing error: {str(e)}")
         finally:
+            if job is not None:
+                jobs.finish(job)
             if os.path.exists(tmp_path):
                 os.unlink(tmp_path)
 
+    @router.post("/transcribe/batch")
+    async def transcribe_audio_batch(
+            request: Request,
+            files: List[UploadFile] = File(...),
+            stream: bool = Query(False),
+            priority: str = Query("bulk"),
+            x_job_id: Optional[str] = Header(None),
+            x_session_id: Optional[str] = Header(None),
+    ):
+        """
+        Пакетное распознавание нескольких файлов или одного zip-архива с аудио
+        (без диаризации и обработки GigaChat). При stream=true результаты отдаются
+        в формате NDJSON по мере готовности файлов, иначе - одним ответом в порядке файлов.
+        """
+        if priority not in ("interactive", "bulk"):
+            raise HTTPException(400, detail=f"Unknown priority '{priority}'")
+        tmp_dir = tempfile.mkdtemp(prefix="batch_")
+        try:
+            if len(files) == 1 and files[0].filename.lower().endswith(".zip"):
+                archive_path = os.path.join(tmp_dir, "upload.zip")
+                with open(archive_path, "wb") as output:
+                    output.write(await files[0].read())
+                try:
+                    inputs = await run_in_threadpool(extract_audio_archive, archive_path, tmp_dir)
+                except zipfile.BadZipFile:
+                    raise HTTPException(400, detail="Invalid zip archive")
+                os.unlink(archive_path)
+            else:
+                inputs = []
+                for i, file in enumerate(files):
+                    if not file.filename.lower().endswith(AUDIO_EXTENSIONS):
+                        raise HTTPException(400, detail=f"Unsupported file format: {file.filename}")
+                    path = os.path.join(tmp_dir, f"{i}{os.path.splitext(file.filename)[1].lower()}")
+                    with open(path, "wb") as output:
+                        output.write(await file.read())
+                    inputs.append((file.filename, path))
+            if not inputs:
+                raise HTTPException(400, detail="No audio files provided")
+
+            model = await run_in_threadpool(get_model)
+            job = register_job(priority, x_job_id, x_session_id)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        names = [name for name, _ in inputs]
+        results = process_audio_batch(
+            [path for _, path in inputs],
+            model,
+            vad=longform_options.get("vad", "pyannote"),
+            cancel=job.cancel,
+            **batch_options,
+        )
+
+        def cleanup():
+            jobs.finish(job)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if stream:
+            async def ndjson():
+                try:
+                    async with gate.slot(job.lane):
+                        async for index, result in executor.iterate(results, cancel=job.cancel):
+                            line = dict(result, filename=names[index])
+                            yield json.dumps(line, ensure_ascii=False) + "\n"
+                finally:
+                    # При отключении клиента распознавание останавливается перед следующим батчем
+                    job.cancel.set()
+                    cleanup()
+
+            return StreamingResponse(
+                ndjson(),
+                media_type="application/x-ndjson",
+                headers={"X-Job-Id": job.id},
+                background=BackgroundTask(cleanup),
+            )
+
+        async def collect():
+            async with gate.slot(job.lane):
+                return await executor.run(list, results)
+
+        try:
+            collected = await run_cancellable(collect(), job, request.is_disconnected)
+        except JobCancelled:
+            raise HTTPException(CANCELLED_STATUS, detail="Request cancelled")
+        finally:
+            cleanup()
+        collected.sort(key=lambda item: item[0])
+        return {"files": [dict(result, filename=names[index]) for index, result in collected]}
+
+    @router.get("/jobs")
+    async def list_jobs(
+            x_session_id: Optional[str] = Header(None),
+            x_admin_token: Optional[str] = Header(None),
+    ):
+        # Задачи только своей сессии (все - с токеном администратора), очередь - общими счётчиками
+        owner = jobs_owner(x_session_id, x_admin_token)
+        return {"jobs": jobs.list(owner), "queue": gate.status()}
+
+    @router.delete("/jobs/{job_id}")
+    async def cancel_job(
+            job_id: str,
+            x_session_id: Optional[str] = Header(None),
+            x_admin_token: Optional[str] = Header(None),
+    ):
+        # Чужая задача неотличима от несуществующей
+        if not jobs.cancel(job_id, jobs_owner(x_session_id, x_admin_token)):
+            raise HTTPException(404, detail="Job not found")
+        return {"message": f"Job {job_id} cancelled"}
+
+    @router.get("/profiles/{profile_id}/trace")
+    async def get_profile_trace(profile_id: str):
+        if not is_valid_profile_id(profile_id) or not os.path.exists(trace_path(profile_id)):
+            raise HTTPException(404, detail="Profile not found")
+        return FileResponse(trace_path(profile_id), media_type="application/json")
+
+    @router.get("/profiles/{profile_id}/summary", response_class=PlainTextResponse)
+    async def get_profile_summary(profile_id: str):
+        if not is_valid_profile_id(profile_id) or not os.path.exists(summary_path(profile_id)):
+            raise HTTPException(404, detail="Profile not found")
+        with open(summary_path(profile_id), encoding="utf-8") as f:
+            return f.read()
+
     @router.post(
         "/summarize",
         response_model=str,
@@ -0,0 +1,118 @@
+"""
+Удалённый воркер распознавания: загружает модель ASR (настройки из app.dependencies)
+и обслуживает распознавание файлов и сегментов по HTTP для WorkerDispatcher.
+
+    python -m app.worker --port 9001
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+# Воркер всегда распознаёт локально, даже если общий .env задаёт INFERENCE_WORKERS
+os.environ["INFERENCE_WORKERS"] = ""
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.dependencies import (
+    ASR_JOB_DIR, ASR_WARMUP, INFERENCE_EXECUTOR, get_emo_model, get_model, EMO_BATCH_SIZE,
+)
+
+# Опции transcribe_longform, принимаемые от диспетчера
+WORKER_OPTIONS = {"use_speaker_diarization", "precompute_features", "vad", "pipeline_diarization"}
+
+state = {"ready": False, "in_flight": 0}
+
+
+async def load():
+    start = time.perf_counter()
+    model = await run_in_threadpool(get_model)
+    if ASR_WARMUP:
+        await run_in_threadpool(model.warmup)
+    state["ready"] = True
+    print(f"[worker] Модель готова за {time.perf_counter() - start:.1f} с")
+
+
+@asynccontextmanager
+async def worker_lifespan(app_: FastAPI):
+    task = asyncio.create_task(load())
+    yield
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    INFERENCE_EXECUTOR.shutdown()
+
+
+app = FastAPI(title="Legal Ally inference worker", lifespan=worker_lifespan)
+
+
+@app.get("/health")
+async def health():
+    # 503, пока модель не загружена: диспетчер не отправляет запросы на этот воркер
+    if not state["ready"]:
+        raise HTTPException(503, detail="Model is loading")
+    return {"status": "ok", "in_flight": state["in_flight"]}
+
+
+@app.post("/transcribe_file")
+async def transcribe_file(file: UploadFile = File(...), options: str = Form("{}")):
+    if not state["ready"]:
+        raise HTTPException(503, detail="Model is loading")
+    options = json.loads(options)
+    longform_options = {k: v for k, v in options.items() if k in WORKER_OPTIONS}
+    # Контрольные точки хранятся на воркере, выполняющем задачу
+    if ASR_JOB_DIR:
+        longform_options["job_dir"] = ASR_JOB_DIR
+    if options.get("emotions"):
+        longform_options["emo_model"] = await run_in_threadpool(get_emo_model)
+        longform_options["emo_batch_size"] = EMO_BATCH_SIZE
+
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(await file.read())
+        tmp_path = tmp.name
+
+    state["in_flight"] += 1
+    try:
+        utterances = await INFERENCE_EXECUTOR.run(
+            get_model().transcribe_longform, tmp_path, **longform_options
+        )
+    except Exception as e:
+        raise HTTPException(500, detail=f"Processing error: {str(e)}")
+    finally:
+        state["in_flight"] -= 1
+        os.unlink(tmp_path)
+    return {"utterances": utterances}
+
+
+@app.post("/transcribe_segment")
+async def transcribe_segment(request: Request):
+    """
+    Тело запроса - сегмент float32 PCM 16 кГц (моно) в байтах.
+    """
+    if not state["ready"]:
+        raise HTTPException(503, detail="Model is loading")
+    import torch
+
+    body = await request.body()
+    segment = torch.frombuffer(bytearray(body), dtype=torch.float32)
+    state["in_flight"] += 1
+    try:
+        transcription = await INFERENCE_EXECUTOR.run(get_model().transcribe_segment, segment)
+    except Exception as e:
+        raise HTTPException(500, detail=f"Processing error: {str(e)}")
+    finally:
+        state["in_flight"] -= 1
+    return {"transcription": transcription}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,10 +1,23 @@
+from threading import Lock
 from typing import List
 from fastapi.concurrency import run_in_threadpool
 
 from core.schemas import TranscriptSegment
-from utils.rag_engine import RAG230FZEngine
 
-# rag_engine = RAG230FZEngine()
+# Индекс закона строится при первой проверке, а не при запуске приложения
+_rag_engine = None
+_rag_engine_lock = Lock()
+
+
+def get_rag_engine():
+    global _rag_engine
+    with _rag_engine_lock:
+        if _rag_engine is None:
+            from utils.rag_engine import RAG230FZEngine
+            _rag_engine = RAG230FZEngine()
+    return _rag_engine
+
 
 async def check_230_fz(json_data: List[TranscriptSegment]) -> str:
+    rag_engine = await run_in_threadpool(get_rag_engine)
     return await run_in_threadpool(rag_engine.check_compliance, json_data)
\ No newline at end of file
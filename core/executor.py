@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class InferenceExecutor:
+    """
+    Выделенный пул потоков для работы моделей (распознавание, pyannote, загрузка и прогрев).
+    Размер пула ограничивает число одновременных задач, а вместе с числом потоков torch/ORT
+    на задачу - общую загрузку CPU; общий пул Starlette остаётся для ввода-вывода и LLM.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="inference"
+        )
+
+    async def _submit(
+            self, func: Callable[..., T], args, kwargs, cancel: Optional[threading.Event] = None
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Поток пула нельзя прервать: отмена ожидающего дожидается его завершения,
+            # чтобы место в PriorityGate освобождалось только после остановки работы
+            if cancel is not None:
+                cancel.set()
+            await asyncio.wait({future})
+            raise
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Выполняет func в пуле. При отмене вызывающей корутины ждёт завершения func.
+        """
+        return await self._submit(func, args, kwargs)
+
+    async def iterate(
+            self, iterator: Iterator[T], cancel: Optional[threading.Event] = None
+    ) -> AsyncIterator[T]:
+        """
+        Асинхронный обход синхронного итератора, каждый шаг которого выполняется в пуле.
+        При отмене устанавливает cancel (итератор останавливается на ближайшей проверке)
+        и дожидается завершения текущего шага.
+        """
+        done = object()
+        while True:
+            item = await self._submit(next, (iterator, done), {}, cancel)
+            if item is done:
+                return
+            yield item
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
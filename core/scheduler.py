@@ -0,0 +1,198 @@
+import asyncio
+import bisect
+import itertools
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Dict, List, Optional
+
+# Приоритетные классы запросов распознавания: меньшее значение обслуживается раньше
+LANES = {"interactive": 0, "bulk": 1}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, lane: str, owner: Optional[str] = None):
+        self.id = job_id
+        self.lane = lane
+        # Сессия клиента, которой разрешено видеть и отменять задачу
+        self.owner = owner
+        # Проверяется между сегментами распознавания и перед вызовами LLM
+        self.cancel = threading.Event()
+        self.created = time.time()
+
+    def check(self) -> None:
+        if self.cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+
+class JobRegistry:
+    """
+    Выполняемые задачи распознавания; позволяет отменить задачу по идентификатору.
+    Если указан owner, list и cancel видят только задачи этой сессии.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def register(self, lane: str, job_id: Optional[str] = None, owner: Optional[str] = None) -> Job:
+        job = Job(job_id or uuid.uuid4().hex, lane, owner)
+        with self._lock:
+            if job.id in self._jobs:
+                raise ValueError(f"Job {job.id} is already running")
+            self._jobs[job.id] = job
+        return job
+
+    def finish(self, job: Job) -> None:
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return False
+        job.cancel.set()
+        return True
+
+    def list(self, owner: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.owner == owner]
+        return [
+            {"job_id": job.id, "lane": job.lane, "cancelled": job.cancel.is_set(),
+             "running_for": round(time.time() - job.created, 1)}
+            for job in jobs
+        ]
+
+
+class PriorityGate:
+    """
+    Ограничивает число одновременных задач распознавания. Ожидающие задачи
+    запускаются по приоритету (interactive раньше bulk), а bulk-задачи занимают
+    не больше bulk_limit мест, чтобы короткие запросы не ждали часовые файлы.
+    """
+
+    def __init__(self, max_concurrent: int, bulk_limit: Optional[int] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.bulk_limit = bulk_limit if bulk_limit is not None else max(1, self.max_concurrent - 1)
+        self._running = {lane: 0 for lane in LANES}
+        # Отсортированный список (приоритет, порядок, класс, future)
+        self._waiters: List = []
+        self._counter = itertools.count()
+
+    def _can_run(self, lane: str) -> bool:
+        if sum(self._running.values()) >= self.max_concurrent:
+            return False
+        return lane != "bulk" or self._running["bulk"] < self.bulk_limit
+
+    def _wake(self) -> None:
+        for waiter in list(self._waiters):
+            _, _, lane, future = waiter
+            if future.done():
+                self._waiters.remove(waiter)
+            elif self._can_run(lane):
+                self._waiters.remove(waiter)
+                self._running[lane] += 1
+                future.set_result(None)
+
+    async def acquire(self, lane: str) -> None:
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, (LANES[lane], next(self._counter), lane, future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Место уже выделено, но задача отменена
+                self.release(lane)
+            raise
+
+    def release(self, lane: str) -> None:
+        self._running[lane] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, lane: str) -> AsyncIterator[None]:
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def status(self) -> Dict:
+        waiting = {lane: 0 for lane in LANES}
+        for _, _, lane, future in self._waiters:
+            if not future.done():
+                waiting[lane] += 1
+        return {"running": dict(self._running), "waiting": waiting}
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """
+    Длительность аудиофайла в секундах (ffprobe) или None, если её не удалось определить.
+    """
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+            capture_output=True, text=True, check=True, timeout=30,
+        ).stdout
+        return float(out.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def choose_lane(path: str, requested: Optional[str], interactive_max_seconds: float) -> str:
+    """
+    Класс запроса: явно указанный клиентом или interactive для записей
+    не длиннее interactive_max_seconds (bulk, если длительность неизвестна).
+    """
+    if requested is not None:
+        if requested not in LANES:
+            raise ValueError(f"Unknown priority '{requested}', expected one of {list(LANES)}")
+        return requested
+    duration = audio_duration(path)
+    if duration is not None and duration <= interactive_max_seconds:
+        return "interactive"
+    return "bulk"
+
+
+async def run_cancellable(
+        coro: Awaitable,
+        job: Job,
+        is_disconnected=None,
+        poll_interval: float = 0.5,
+):
+    """
+    Выполняет корутину задачи, проверяя каждые poll_interval секунд отключение клиента
+    (is_disconnected - например, request.is_disconnected) и явную отмену задачи.
+    При отмене устанавливает job.cancel (распознавание останавливается перед
+    следующим сегментом) и выбрасывает JobCancelled после остановки задачи:
+    InferenceExecutor дожидается рабочего потока, поэтому место в PriorityGate
+    освобождается только когда распознавание действительно прекратилось.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                if task.exception() is not None and job.cancel.is_set():
+                    # Распознавание или LLM-вызов остановлены по отмене
+                    raise JobCancelled(f"Job {job.id} cancelled")
+                return task.result()
+            if not job.cancel.is_set() and is_disconnected is not None and await is_disconnected():
+                print(f"[jobs] Клиент отключился, задача {job.id} отменяется")
+                job.cancel.set()
+            if job.cancel.is_set():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise JobCancelled(f"Job {job.id} cancelled")
+    except asyncio.CancelledError:
+        job.cancel.set()
+        task.cancel()
+        raise
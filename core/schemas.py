@@ -1,11 +1,12 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 
 class TranscriptSegment(BaseModel):
     speaker: Optional[str]
     start: str
     end: str
     text: str
+    emotions: Optional[Dict[str, float]] = None
 
     class Config:
         exclude_none = True
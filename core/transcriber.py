@@ -1,9 +1,13 @@
-from typing import List, Dict
-from GigaAM import gigaam
+import threading
+from contextlib import nullcontext
+from typing import Iterator, List, Dict, Optional, Tuple
 from fastapi.concurrency import run_in_threadpool
 from langchain_core.messages import HumanMessage, SystemMessage
 import ast
+from core.executor import InferenceExecutor
+from core.scheduler import Job, PriorityGate
 from utils.giga_chat import get_giga_chat
+from utils.profiler import profile_inference
 
 system_prompt = """
 Ты получаешь на входе массив JSON-записей, каждая из которых содержит транскрибацию разговора по сегментам.
@@ -24,27 +28,61 @@ system_prompt = """
 Используй только ОДИНАРНЫЕ кавычки
 """
 
-async def process_audio(audio_path: str, model, diarize: bool, grammar: bool) -> Dict[str, List[Dict]]:
-
-    recognition_result = await run_in_threadpool(
-        model.transcribe_longform,
-        audio_path,
-        use_speaker_diarization=diarize
-    )
+def format_segments(recognition_result: List[Dict], diarize: bool) -> List[Dict]:
+    from GigaAM.gigaam.utils import format_time
 
     segments: List[Dict] = []
     for utterance in recognition_result:
         segment = {
-            "start": gigaam.format_time(utterance["boundaries"][0]),
-            "end": gigaam.format_time(utterance["boundaries"][1]),
+            "start": format_time(utterance["boundaries"][0]),
+            "end": format_time(utterance["boundaries"][1]),
             "text": utterance["transcription"],
             "speaker": utterance.get("speaker") if diarize else None
         }
+        if "emotions" in utterance:
+            segment["emotions"] = utterance["emotions"]
         segments.append(segment)
+    return segments
+
+async def process_audio(
+        audio_path: str,
+        model,
+        diarize: bool,
+        grammar: bool,
+        profile_id: Optional[str] = None,
+        job: Optional[Job] = None,
+        gate: Optional[PriorityGate] = None,
+        executor: Optional[InferenceExecutor] = None,
+        **longform_options,
+) -> Dict[str, List[Dict]]:
+    # Отмена задачи проверяется между сегментами распознавания и перед вызовом GigaChat
+    if job is not None:
+        longform_options["cancel"] = job.cancel
+
+    def recognize():
+        with profile_inference(profile_id):
+            return model.transcribe_longform(
+                audio_path, use_speaker_diarization=diarize, **longform_options
+            )
+
+    # Место в очереди распознавания занимается только на время работы модели
+    slot = gate.slot(job.lane) if gate is not None and job is not None else nullcontext()
+    async with slot:
+        if executor is not None:
+            recognition_result = await executor.run(recognize)
+        else:
+            recognition_result = await run_in_threadpool(recognize)
+    segments = format_segments(recognition_result, diarize)
 
     if not grammar:
         return {"transcript": segments}
 
+    # Эмоции не передаются в LLM и возвращаются к сегментам по их границам
+    emotions = {(s["start"], s["end"]): s.pop("emotions") for s in segments if "emotions" in s}
+
+    if job is not None:
+        job.check()
+
     messages = [
         SystemMessage(content=system_prompt),
         HumanMessage(content=str(segments))
@@ -57,4 +95,32 @@ async def process_audio(audio_path: str, model, diarize: bool, grammar: bool) ->
         print(f"Ошибка при транскрибировании с помощью GigaChat: {str(e)}")
         ai_segments = []
 
+    for segment in ai_segments:
+        if (segment.get("start"), segment.get("end")) in emotions:
+            segment["emotions"] = emotions[(segment["start"], segment["end"])]
+
     return {"transcript": ai_segments,}
+
+
+def process_audio_batch(
+        audio_paths: List[str],
+        model,
+        batch_size: int = 8,
+        decode_workers: int = 4,
+        vad: str = "pyannote",
+        cancel: Optional[threading.Event] = None,
+) -> Iterator[Tuple[int, Dict]]:
+    """
+    Распознаёт набор файлов без диаризации и обработки GigaChat: файлы декодируются
+    параллельно, а сегменты разных файлов объединяются в общие батчи энкодера.
+    Возвращает пары (индекс файла, {"transcript": [...]} или {"error": ...})
+    по мере готовности файлов.
+    """
+    for index, result in model.transcribe_files(
+            audio_paths, batch_size=batch_size, decode_workers=decode_workers, vad=vad,
+            cancel=cancel,
+    ):
+        if isinstance(result, Exception):
+            yield index, {"error": f"Processing error: {str(result)}"}
+        else:
+            yield index, {"transcript": format_segments(result, diarize=False)}
@@ -0,0 +1,111 @@
+"""
+Проверка внимания Conformer на scaled_dot_product_attention:
+1) выходы ConformerEncoder совпадают с исходной реализацией внимания (явная матрица
+   оценок, плотная маска B x T x T, softmax) на батче последовательностей разной длины;
+2) выходы для батча совпадают с выходами по одной последовательности.
+При --frames больше 4 * att_chunk_size (1024) rel_pos проверяется и с разбиением запросов на блоки.
+
+    python -m scripts.attention_parity [--attention rotary|rel_pos] [--batch 4] [--frames 1500]
+"""
+import argparse
+import copy
+import math
+import types
+
+import torch
+
+from GigaAM.gigaam.encoder import (
+    ConformerEncoder,
+    RelPositionMultiHeadAttention,
+    RotaryPositionMultiHeadAttention,
+)
+
+
+def dense_attention(module, scores, value, mask):
+    # Исходная реализация: маска [B, T, T] по валидным запросам и ключам
+    b = value.size(0)
+    if mask is not None:
+        valid = ~mask[:, 0, 0, :]
+        dense_mask = ~(valid[:, :, None] & valid[:, None, :]).unsqueeze(1)
+        scores = scores.masked_fill(dense_mask, -10000.0)
+        attn = torch.softmax(scores, dim=-1).masked_fill(dense_mask, 0.0)
+    else:
+        attn = torch.softmax(scores, dim=-1)
+    x = torch.matmul(attn, value)
+    x = x.transpose(1, 2).reshape(b, -1, module.h * module.d_k)
+    return module.linear_out(x)
+
+
+def legacy_rel_pos_forward(self, query, key, value, pos_emb, mask=None):
+    q, k, v = self.forward_qkv(query, key, value)
+    q = q.transpose(1, 2)
+    p = self.linear_pos(pos_emb)
+    p = p.view(pos_emb.shape[0], -1, self.h, self.d_k).transpose(1, 2)
+    q_with_bias_u = (q + self.pos_bias_u).transpose(1, 2)
+    q_with_bias_v = (q + self.pos_bias_v).transpose(1, 2)
+    matrix_bd = self.rel_shift(torch.matmul(q_with_bias_v, p.transpose(-2, -1)))
+    matrix_ac = torch.matmul(q_with_bias_u, k.transpose(-2, -1))
+    matrix_bd = matrix_bd[:, :, :, : matrix_ac.size(-1)]
+    scores = (matrix_ac + matrix_bd) / math.sqrt(self.d_k)
+    return dense_attention(self, scores, v, mask)
+
+
+def legacy_forward_attention(self, query, key, value, mask, attn_bias=None):
+    scores = torch.matmul(query, key.transpose(-2, -1) / math.sqrt(self.d_k))
+    return dense_attention(self, scores, value, mask)
+
+
+def legacy_encoder(encoder: ConformerEncoder) -> ConformerEncoder:
+    legacy = copy.deepcopy(encoder)
+    for module in legacy.modules():
+        if isinstance(module, RelPositionMultiHeadAttention):
+            module.forward = types.MethodType(legacy_rel_pos_forward, module)
+        elif isinstance(module, RotaryPositionMultiHeadAttention):
+            module.forward_attention = types.MethodType(legacy_forward_attention, module)
+    return legacy
+
+
+def max_valid_diff(a, b, lengths) -> float:
+    # Последний кадр после субдискретизации зависит от паддинга свёрток
+    return max(
+        (a[i, :, : n - 1] - b[i, :, : n - 1]).abs().max().item()
+        for i, n in enumerate(lengths.tolist())
+    )
+
+
+@torch.inference_mode()
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attention", default="rotary", choices=["rotary", "rel_pos"])
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=1500)
+    parser.add_argument("--layers", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    encoder = ConformerEncoder(n_layers=args.layers, self_attention_model=args.attention)
+    for param in encoder.parameters():
+        torch.nn.init.normal_(param, std=0.02)
+    encoder.eval()
+
+    lengths = torch.randint(args.frames // 4, args.frames + 1, (args.batch,))
+    lengths[0] = args.frames
+    features = torch.randn(args.batch, encoder.feat_in, args.frames)
+    batched, batched_len = encoder(features, lengths)
+
+    legacy, legacy_len = legacy_encoder(encoder)(features, lengths)
+    assert torch.equal(legacy_len, batched_len)
+    legacy_diff = max_valid_diff(batched, legacy, batched_len)
+    print(f"{args.attention}: max abs diff vs. original attention = {legacy_diff:.2e}")
+
+    singles = []
+    for i in range(args.batch):
+        single, single_len = encoder(features[i : i + 1, :, : lengths[i]], lengths[i : i + 1])
+        assert single_len.item() == batched_len[i].item()
+        singles.append(torch.nn.functional.pad(single, (0, batched.shape[-1] - single.shape[-1])))
+    single_diff = max_valid_diff(batched, torch.cat(singles), batched_len)
+    print(f"{args.attention}: max abs diff between batched and single = {single_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Сравнение бэкендов torch и ONNX Runtime на CPU: совпадение транскрипций и RTF.
+
+    python -m scripts.bench_backends path/to/audio_dir --onnx-dir ~/.cache/gigaam/onnx
+"""
+import argparse
+import time
+
+from GigaAM import gigaam
+from GigaAM.gigaam.onnx_utils import load_onnx_model
+from GigaAM.gigaam.preprocess import SAMPLE_RATE
+from GigaAM.gigaam.vad_utils import segment_audio
+from scripts.metrics import cer, list_audio_files, wer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio", help="Аудиофайл или каталог с файлами")
+    parser.add_argument("--model", default="v2_rnnt")
+    parser.add_argument("--onnx-dir", default="onnx")
+    args = parser.parse_args()
+
+    torch_model = gigaam.load_model(args.model, fp16_encoder=False, device="cpu")
+    onnx_model = load_onnx_model(args.model, args.onnx_dir)
+    backends = {"torch": torch_model, "onnx": onnx_model}
+
+    # Сегментация общая для обоих бэкендов и в замер не входит
+    segments = []
+    for path in list_audio_files(args.audio):
+        wav = gigaam.load_audio(path, return_format="int")
+        segments.extend(segment_audio(wav, SAMPLE_RATE)[0])
+    audio_seconds = sum(seg.shape[-1] for seg in segments) / SAMPLE_RATE
+
+    results = {}
+    for name, backend in backends.items():
+        backend.transcribe_segment(segments[0])  # прогрев
+        start = time.perf_counter()
+        results[name] = [backend.transcribe_segment(seg) for seg in segments]
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed:.2f} s for {audio_seconds:.1f} s of audio, RTF={elapsed / audio_seconds:.4f}")
+
+    mismatched = sum(t != o for t, o in zip(results["torch"], results["onnx"]))
+    print(f"Segments: {len(segments)}, mismatched: {mismatched}")
+    print(f"WER(onnx vs torch)={wer(results['torch'], results['onnx']):.4f}, "
+          f"CER(onnx vs torch)={cer(results['torch'], results['onnx']):.4f}")
+
+
+if __name__ == "__main__":
+    main()
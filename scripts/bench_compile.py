@@ -0,0 +1,61 @@
+"""
+Компиляция энкодера с бакетами по длине: время компиляции (прогрева),
+задержка первого запроса и RTF в установившемся режиме по сравнению с eager.
+
+    python -m scripts.bench_compile [--model v2_rnnt] [--mode compile|script] [--segments 30]
+"""
+import argparse
+import random
+import time
+
+import torch
+
+from GigaAM import gigaam
+from GigaAM.gigaam.preprocess import SAMPLE_RATE
+
+
+def make_segments(count, seed=0):
+    # Длины как у segment_audio: непрерывно распределены до 22 с
+    rng = random.Random(seed)
+    return [0.05 * torch.randn(int(rng.uniform(3.0, 22.0) * SAMPLE_RATE)) for _ in range(count)]
+
+
+def measure(model, segments):
+    start = time.perf_counter()
+    model.transcribe_segment(segments[0])
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for segment in segments[1:]:
+        model.transcribe_segment(segment)
+    elapsed = time.perf_counter() - start
+    audio = sum(seg.shape[-1] for seg in segments[1:]) / SAMPLE_RATE
+    return first, elapsed / audio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="v2_rnnt")
+    parser.add_argument("--mode", default="compile", choices=["compile", "script"])
+    parser.add_argument("--segments", type=int, default=30)
+    args = parser.parse_args()
+
+    segments = make_segments(args.segments)
+
+    eager = gigaam.load_model(args.model, fp16_encoder=False)
+    first, rtf = measure(eager, segments)
+    print(f"eager: first request {first:.2f} s, steady RTF {rtf:.4f}")
+    del eager
+
+    compiled = gigaam.load_model(args.model, fp16_encoder=False)
+    compiled.compile_encoder(mode=args.mode)
+    start = time.perf_counter()
+    timings = compiled.warmup()
+    print(f"{args.mode}: warmup (compile) {time.perf_counter() - start:.1f} s, per bucket: "
+          + ", ".join(f"{k}={v:.1f}s" for k, v in timings.items()))
+    first, rtf = measure(compiled, segments)
+    print(f"{args.mode}: first request {first:.2f} s, steady RTF {rtf:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Масштабирование распознавания по процессам: сегменты VAD распределяются по пулу
+из 1..N воркеров (ShardedTranscriber), у каждого воркера ядра / N потоков torch.
+Выводит RTF и ускорение относительно одного воркера, проверяет совпадение транскрипций.
+
+    python -m scripts.bench_sharding path/to/audio_dir [--max-workers 8] [--quantize int8]
+"""
+import argparse
+import os
+import time
+
+from GigaAM import gigaam
+from GigaAM.gigaam.preprocess import SAMPLE_RATE
+from GigaAM.gigaam.sharding import ShardedTranscriber
+from GigaAM.gigaam.utils import available_cpus
+from GigaAM.gigaam.vad_utils import segment_audio
+from scripts.metrics import list_audio_files
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio", help="Аудиофайл или каталог с файлами")
+    parser.add_argument("--model", default="v2_rnnt")
+    parser.add_argument("--max-workers", type=int, default=len(available_cpus()))
+    parser.add_argument("--quantize", default=None)
+    parser.add_argument("--vad", default="energy", help="pyannote или energy")
+    args = parser.parse_args()
+
+    load_kwargs = {"quantize": args.quantize}
+    # Сконвертированный чекпоинт создаётся заранее, чтобы воркеры загружали его через mmap
+    gigaam.load_model(args.model, device="cpu", **load_kwargs)
+
+    # Сегментация общая для всех конфигураций и в замер не входит
+    segments = []
+    for path in list_audio_files(args.audio):
+        wav = gigaam.load_audio(path, return_format="int")
+        segments.extend(segment_audio(wav, SAMPLE_RATE, vad=args.vad)[0])
+    audio_seconds = sum(seg.shape[-1] for seg in segments) / SAMPLE_RATE
+    print(f"Segments: {len(segments)}, audio: {audio_seconds:.1f} s, cores: {os.cpu_count()}")
+
+    counts = []
+    workers = 1
+    while workers < args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(args.max_workers)
+
+    baseline, reference = None, None
+    for num_workers in counts:
+        sharded = ShardedTranscriber(args.model, num_workers, **load_kwargs)
+        sharded.warmup()
+        start = time.perf_counter()
+        results = sharded.transcribe_segments(segments)
+        elapsed = time.perf_counter() - start
+        sharded.close()
+
+        if baseline is None:
+            baseline, reference = elapsed, results
+        mismatched = sum(r != t for r, t in zip(reference, results))
+        print(f"{num_workers} workers x {sharded.threads_per_worker} threads: {elapsed:.2f} s, "
+              f"RTF={elapsed / audio_seconds:.4f}, speedup x{baseline / elapsed:.2f}, "
+              f"mismatched: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
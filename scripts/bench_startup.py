@@ -0,0 +1,56 @@
+"""
+Время запуска: загрузка исходного чекпоинта против кешированного
+сконвертированного (mmap) для выбранного устройства (на GPU кешируются fp16-веса энкодера).
+Каждый замер выполняется в отдельном процессе, чтобы не учитывать прогретые кеши Python.
+
+    python -m scripts.bench_startup [--model v2_rnnt] [--device cpu] [--runs 3]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+_LOAD = """
+import json, sys, time
+start = time.perf_counter()
+from GigaAM import gigaam
+imported = time.perf_counter()
+gigaam.load_model(**json.loads(sys.argv[1]))
+loaded = time.perf_counter()
+print(json.dumps({"import": imported - start, "load": loaded - imported}))
+"""
+
+
+def run_load(kwargs):
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", _LOAD, json.dumps(kwargs)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="v2_rnnt")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    kwargs = {"model_name": args.model, "device": args.device}
+    # Первый запуск с кешем создаёт сконвертированный чекпоинт
+    run_load(kwargs)
+    variants = {"checkpoint": dict(kwargs, use_cache=False), "converted (mmap)": kwargs}
+
+    for name, variant in variants.items():
+        runs = [run_load(variant) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["total"])
+        print(f"{name}: total {best['total']:.2f} s, import {best['import']:.2f} s, "
+              f"load_model {best['load']:.2f} s (best of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
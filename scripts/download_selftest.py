@@ -0,0 +1,114 @@
+"""
+Проверка загрузчика моделей на локальном HTTP-сервере с поддержкой Range:
+параллельная загрузка, докачка после обрыва, проверка SHA256 и отказ при несовпадении хеша.
+
+    python -m scripts.download_selftest [--size-mb 64]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from GigaAM.gigaam.download import SHA256_MANIFEST, download_file
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    payload = b""
+    # Номера запросов диапазонов, которые сервер обрывает (имитация сбоя сети)
+    fail_requests = set()
+    range_requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        header = self.headers.get("Range")
+        if header is None:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(self.payload)))
+            self.end_headers()
+            self.wfile.write(self.payload)
+            return
+
+        with self.lock:
+            RangeHandler.range_requests += 1
+            request_id = RangeHandler.range_requests
+        start, end = (int(x) for x in header.split("=")[1].split("-"))
+        body = self.payload[start : end + 1]
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if request_id in self.fail_requests:
+            # Отдаём половину диапазона и закрываем соединение
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    RangeHandler.payload = os.urandom(args.size_mb << 20)
+    sha256 = hashlib.sha256(RangeHandler.payload).hexdigest()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/model.ckpt"
+    chunk_size = 4 << 20
+
+    with tempfile.TemporaryDirectory() as root:
+        # 1. Обрыв одного диапазона: загрузка падает, .ckpt не создаётся
+        path = os.path.join(root, "model.ckpt")
+        RangeHandler.fail_requests = {3}
+        try:
+            download_file(url, path, chunk_size=chunk_size)
+            interrupted = False
+        except Exception:
+            interrupted = True
+        assert interrupted, "Interrupted download must fail"
+        assert not os.path.exists(path), "Partial download must not be visible"
+        with open(path + ".part.json", encoding="utf-8") as f:
+            done = len(json.load(f)["done"])
+        print(f"interrupted: {done} chunks saved, target file absent")
+
+        # 2. Докачка: запрашиваются только недостающие диапазоны
+        RangeHandler.fail_requests = set()
+        before = RangeHandler.range_requests
+        download_file(url, path, chunk_size=chunk_size)
+        resumed = RangeHandler.range_requests - before
+        total = -(-len(RangeHandler.payload) // chunk_size)
+        assert resumed == total - done, (resumed, total, done)
+        with open(os.path.join(root, SHA256_MANIFEST), encoding="utf-8") as f:
+            assert json.load(f)["model.ckpt"] == sha256
+        print(f"resumed: {resumed} of {total} chunks fetched, SHA256 recorded in manifest")
+
+        # 3. Несовпадение хеша: файл отклоняется
+        other = os.path.join(root, "other.ckpt")
+        error = None
+        try:
+            download_file(url, other, chunk_size=chunk_size, expected_sha256="0" * 64)
+        except RuntimeError as exc:
+            error = exc
+        assert error is not None, "SHA256 mismatch must fail"
+        assert not os.path.exists(other) and not os.path.exists(other + ".part")
+        print(f"rejected: {error}")
+
+    server.shutdown()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Бюджет холодного старта: время импорта `app.main` (python -X importtime)
+и проверка, что тяжёлые зависимости не импортируются при запуске приложения.
+Завершается с ненулевым кодом при превышении бюджета, поэтому подходит для CI.
+
+    python -m scripts.import_budget [--module app.main] [--budget 3.0] [--top 15]
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+# Загружаются лениво: при первом распознавании, проверке 230-ФЗ или чате
+HEAVY_MODULES = [
+    "torch",
+    "torchaudio",
+    "hydra",
+    "pyannote",
+    "pydub",
+    "sentencepiece",
+    "tiktoken",
+    "chromadb",
+    "langchain_chroma",
+    "langchain_gigachat",
+    "langchain_community",
+    "langchain_text_splitters",
+]
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module):
+    """
+    Возвращает (module, self_us, cumulative_us, depth) для каждого импортированного модуля.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Не удалось импортировать {module}")
+
+    records = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget", type=float, default=3.0, help="секунды")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    records = profile_imports(args.module)
+    total = sum(self_us for _, self_us, _, _ in records) / 1e6
+    top_level = sorted(
+        (r for r in records if r[3] == 0), key=lambda r: r[2], reverse=True
+    )[: args.top]
+
+    print(f"Импорт {args.module}: {total:.2f} с (бюджет {args.budget:.2f} с)")
+    for name, _, cumulative_us, _ in top_level:
+        print(f"  {cumulative_us / 1e6:7.3f} с  {name}")
+
+    imported = {name.split(".")[0] for name, _, _, _ in records}
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+
+    failed = False
+    if heavy:
+        print(f"Тяжёлые зависимости импортируются при запуске: {', '.join(heavy)}")
+        failed = True
+    if total > args.budget:
+        print("Превышен бюджет времени импорта")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Метрики и вспомогательные функции для скриптов бенчмарков.
+"""
+import glob
+import os
+from typing import List, Sequence
+
+
+def edit_distance(ref: Sequence, hyp: Sequence) -> int:
+    """
+    Расстояние Левенштейна между двумя последовательностями.
+    """
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        curr = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            curr[j] = min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = curr
+    return prev[-1]
+
+
+def wer(refs: List[str], hyps: List[str]) -> float:
+    errors = sum(edit_distance(r.split(), h.split()) for r, h in zip(refs, hyps))
+    total = sum(len(r.split()) for r in refs)
+    return errors / max(total, 1)
+
+
+def cer(refs: List[str], hyps: List[str]) -> float:
+    errors = sum(edit_distance(r, h) for r, h in zip(refs, hyps))
+    total = sum(len(r) for r in refs)
+    return errors / max(total, 1)
+
+
+def list_audio_files(path: str) -> List[str]:
+    """
+    Возвращает путь к файлу или все аудиофайлы каталога.
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for ext in ("wav", "mp3", "m4a", "flac"):
+        files.extend(glob.glob(os.path.join(path, f"*.{ext}")))
+    return sorted(files)
@@ -0,0 +1,60 @@
+"""
+Оценка INT8-квантизации на CPU: дрейф WER/CER относительно fp32 и ускорение.
+
+    python -m scripts.quantization_drift path/to/samples [--model v2_rnnt] [--quantize-joint]
+
+Для файла `name.wav` эталонная расшифровка берётся из `name.txt`, если он есть;
+иначе метрики считаются относительно транскрипций fp32-модели.
+"""
+import argparse
+import os
+import time
+
+from GigaAM import gigaam
+from scripts.metrics import cer, list_audio_files, wer
+
+
+def transcribe_all(model, files):
+    start = time.perf_counter()
+    texts = [model.transcribe(path) for path in files]
+    return texts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("samples", help="Каталог с короткими (до 25 с) аудиофайлами")
+    parser.add_argument("--model", default="v2_rnnt")
+    parser.add_argument("--quantize-joint", action="store_true")
+    args = parser.parse_args()
+
+    files = list_audio_files(args.samples)
+    fp32 = gigaam.load_model(args.model, fp16_encoder=False, device="cpu")
+    int8 = gigaam.load_model(
+        args.model, device="cpu", quantize="int8", quantize_joint=args.quantize_joint
+    )
+
+    fp32.transcribe(files[0])  # прогрев
+    int8.transcribe(files[0])
+    fp32_texts, fp32_time = transcribe_all(fp32, files)
+    int8_texts, int8_time = transcribe_all(int8, files)
+
+    refs = []
+    num_refs = 0
+    for path, fp32_text in zip(files, fp32_texts):
+        ref_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding="utf-8") as f:
+                refs.append(f.read().strip().lower())
+            num_refs += 1
+        else:
+            refs.append(fp32_text)
+
+    print(f"Files: {len(files)}, with references: {num_refs}")
+    print(f"fp32: WER={wer(refs, fp32_texts):.4f} CER={cer(refs, fp32_texts):.4f} time={fp32_time:.2f} s")
+    print(f"int8: WER={wer(refs, int8_texts):.4f} CER={cer(refs, int8_texts):.4f} time={int8_time:.2f} s")
+    print(f"Drift int8 vs fp32: WER={wer(fp32_texts, int8_texts):.4f} CER={cer(fp32_texts, int8_texts):.4f}")
+    print(f"Speedup: {fp32_time / int8_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Локальная проверка режима удалённых воркеров: запускает несколько процессов app.worker
+на одной машине, распознаёт файлы через WorkerDispatcher параллельно, затем останавливает
+один воркер и проверяет, что запросы повторяются на оставшихся.
+
+    python -m scripts.remote_workers path/to/audio_dir [--workers 2] [--base-port 9101]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.dispatcher import WorkerDispatcher
+from scripts.metrics import list_audio_files
+
+
+def run_all(dispatcher, files):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2 * len(dispatcher.workers)) as executor:
+        results = list(executor.map(dispatcher.transcribe_longform, files))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio", help="Аудиофайл или каталог с файлами")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=9101)
+    args = parser.parse_args()
+
+    ports = [args.base_port + i for i in range(args.workers)]
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "app.worker", "--port", str(port)])
+        for port in ports
+    ]
+    dispatcher = WorkerDispatcher([f"http://localhost:{port}" for port in ports], health_interval=2.0)
+    try:
+        ready = dispatcher.warmup()
+        print(f"Workers ready: {ready}")
+        assert len(ready) == args.workers, "Not all workers started"
+
+        files = list_audio_files(args.audio)
+        results, elapsed = run_all(dispatcher, files)
+        print(f"{len(files)} files on {args.workers} workers: {elapsed:.2f} s")
+
+        if args.workers > 1:
+            # Остановка воркера: запросы должны уйти на оставшиеся
+            processes[0].terminate()
+            processes[0].wait()
+            retried, elapsed = run_all(dispatcher, files)
+            assert retried == results, "Results differ after worker failure"
+            print(f"1 worker stopped: {len(files)} files in {elapsed:.2f} s, results match")
+        print("OK")
+    finally:
+        dispatcher.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
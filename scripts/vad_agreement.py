@@ -0,0 +1,85 @@
+"""
+Сравнение встроенного energy VAD с pyannote: покадровое совпадение речи/пауз,
+расхождение границ итоговых чанков segment_audio и скорость (кратность реального времени).
+
+    python -m scripts.vad_agreement path/to/audio_dir [--device cpu]
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+import torch
+
+from GigaAM import gigaam
+from GigaAM.gigaam.energy_vad import energy_vad
+from GigaAM.gigaam.preprocess import SAMPLE_RATE
+from GigaAM.gigaam.vad_utils import merge_speech, pyannote_speech
+from scripts.metrics import list_audio_files
+
+FRAME_SEC = 0.01
+
+
+def speech_mask(regions: List[Tuple[float, float]], duration: float) -> torch.Tensor:
+    mask = torch.zeros(int(duration / FRAME_SEC) + 1, dtype=torch.bool)
+    for start, end in regions:
+        mask[int(start / FRAME_SEC) : int(end / FRAME_SEC)] = True
+    return mask
+
+
+def boundary_offsets(
+    ref: List[Tuple[float, float]], hyp: List[Tuple[float, float]]
+) -> List[float]:
+    # Для каждой внутренней границы чанка pyannote - расстояние до ближайшей границы energy VAD
+    ref_cuts = [end for _, end in ref[:-1]]
+    hyp_cuts = [end for _, end in hyp[:-1]] or [0.0]
+    return [min(abs(cut - other) for other in hyp_cuts) for cut in ref_cuts]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio", help="Аудиофайл или каталог с файлами")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    tp = fp = fn = tn = 0
+    offsets: List[float] = []
+    audio_sec = energy_sec = pyannote_sec = 0.0
+    for path in list_audio_files(args.audio):
+        wav = gigaam.load_audio(path, return_format="int")
+        duration = wav.shape[-1] / SAMPLE_RATE
+
+        start = time.perf_counter()
+        ref = pyannote_speech(wav, SAMPLE_RATE, device=args.device)
+        pyannote_sec += time.perf_counter() - start
+        start = time.perf_counter()
+        hyp = energy_vad(wav.float() / 32768.0, SAMPLE_RATE)
+        energy_sec += time.perf_counter() - start
+        audio_sec += duration
+
+        ref_mask, hyp_mask = speech_mask(ref, duration), speech_mask(hyp, duration)
+        tp += int((ref_mask & hyp_mask).sum())
+        fp += int((~ref_mask & hyp_mask).sum())
+        fn += int((ref_mask & ~hyp_mask).sum())
+        tn += int((~ref_mask & ~hyp_mask).sum())
+
+        ref_chunks, hyp_chunks = merge_speech(ref, duration), merge_speech(hyp, duration)
+        file_offsets = boundary_offsets(ref_chunks, hyp_chunks)
+        offsets.extend(file_offsets)
+        print(f"{path}: chunks pyannote={len(ref_chunks)} energy={len(hyp_chunks)}, "
+              f"median boundary offset {torch.tensor(file_offsets or [0.0]).median():.2f} s")
+
+    precision = tp / max(1, tp + fp)
+    recall = tp / max(1, tp + fn)
+    print(f"Кадры речи: precision={precision:.3f} recall={recall:.3f} "
+          f"F1={2 * precision * recall / max(1e-9, precision + recall):.3f} "
+          f"accuracy={(tp + tn) / max(1, tp + fp + fn + tn):.3f}")
+    if offsets:
+        offsets_t = torch.tensor(offsets)
+        print(f"Границы чанков: median offset {offsets_t.median():.2f} s, "
+              f"within 0.5 s: {(offsets_t <= 0.5).float().mean():.1%}")
+    print(f"Скорость: energy x{audio_sec / energy_sec:.0f} реального времени, "
+          f"pyannote x{audio_sec / pyannote_sec:.0f}")
+
+
+if __name__ == "__main__":
+    main()
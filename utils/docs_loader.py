@@ -1,7 +1,6 @@
 import glob
 import os
 
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
 import json
 from typing import List
@@ -10,6 +9,8 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PDF_FILES_PATH = os.path.join(BASE_DIR, "..", "docs")
 
 def load_pdfs(folder_path: str = PDF_FILES_PATH) -> List[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
     docs = []
     if os.path.isdir(folder_path):
         for pdf_file in glob.glob(f"{folder_path}/*.pdf"):
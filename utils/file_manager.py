@@ -1,10 +1,9 @@
 import os
 import tempfile
 import json
+from functools import lru_cache
 from typing import List, Union, Dict
 
-import tiktoken
-
 from core.schemas import TranscriptSegment
 
 FILE_PATH = '../resultFiles'
@@ -56,11 +55,17 @@ def json_to_readable_text(json_input: List[TranscriptSegment]) -> str:
 
     return "\n".join(lines)
 
+@lru_cache(maxsize=None)
+def _get_encoding(model_name: str):
+    # tiktoken импортируется при первом использовании: он долго загружается
+    import tiktoken
+    return tiktoken.encoding_for_model(model_name)
+
 def split_text_by_token_limit(text: str, max_tokens: int = 4096, model_name: str = "gpt-3.5-turbo") -> List[str]:
     """
     Разбивает текст на части, чтобы каждая часть укладывалась в лимит по токенам.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
+    encoding = _get_encoding(model_name)
     lines = text.split("\n")
 
     chunks = []
@@ -1,10 +1,15 @@
 import os
-from langchain_gigachat.chat_models import GigaChat
+from typing import TYPE_CHECKING
 from dotenv import find_dotenv, load_dotenv
 
+if TYPE_CHECKING:
+    from langchain_gigachat.chat_models import GigaChat
+
 load_dotenv(find_dotenv())
 
-def get_giga_chat(model_name="GigaChat-2-Max", temp_value=0.87, top_p_value=0.47) -> GigaChat:
+def get_giga_chat(model_name="GigaChat-2-Max", temp_value=0.87, top_p_value=0.47) -> "GigaChat":
+    from langchain_gigachat.chat_models import GigaChat
+
     chat_model = GigaChat(
         scope="GIGACHAT_API_CORP",
         credentials=os.environ.get("GIGACHAT_CREDENTIALS"),
@@ -0,0 +1,78 @@
+import os
+import random
+import re
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "legal_ally_profiles"))
+# Доля запросов, профилируемых без явного флага (0 - выключено)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Два профиля не пересекаются во времени; операции других запросов, выполняемых
+# параллельно, при этом всё равно попадают в trace (см. profile_inference)
+_profile_lock = threading.Lock()
+
+
+def new_profile_id(requested: bool) -> Optional[str]:
+    """
+    Возвращает идентификатор профиля, если запрос нужно профилировать
+    (явный флаг или попадание в выборку PROFILE_SAMPLE_RATE), иначе None.
+    """
+    if requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+        return uuid.uuid4().hex
+    return None
+
+
+def trace_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.trace.json")
+
+
+def summary_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.ops.txt")
+
+
+def is_valid_profile_id(profile_id: str) -> bool:
+    return bool(_PROFILE_ID_RE.match(profile_id))
+
+
+@contextmanager
+def profile_inference(profile_id: Optional[str]) -> Iterator[None]:
+    """
+    Оборачивает инференс в torch.profiler и сохраняет Chrome trace
+    и сводку по операторам в PROFILE_DIR. При profile_id=None ничего не делает.
+
+    torch.profiler записывает операции всех потоков процесса: если одновременно
+    выполняются другие запросы (ASR_CONCURRENCY > 1), их операции тоже попадут
+    в trace и сводку. Для чистого профиля используйте ASR_CONCURRENCY=1.
+    """
+    if profile_id is None:
+        yield
+        return
+
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    from GigaAM.gigaam.utils import set_profiling
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    with _profile_lock:
+        prof = profile(activities=activities, record_shapes=True)
+        prof.start()
+        set_profiling(True)
+        try:
+            yield
+        finally:
+            set_profiling(False)
+            prof.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            prof.export_chrome_trace(trace_path(profile_id))
+            with open(summary_path(profile_id), "w", encoding="utf-8") as f:
+                f.write(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+            print(f"[profiler] Профиль {profile_id} сохранён в {PROFILE_DIR}")
@@ -3,11 +3,6 @@ from typing import List
 from dotenv import load_dotenv, find_dotenv
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_gigachat.embeddings.gigachat import GigaChatEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from starlette.concurrency import run_in_threadpool
 import tempfile
@@ -20,21 +15,42 @@ from utils.file_manager import json_to_readable_text, split_text_by_token_limit
 
 load_dotenv(find_dotenv())
 
-class RAG230FZEngine:
-    def __init__(self):
-        self.embeddings = GigaChatEmbeddings(
-            model="EmbeddingsGigaR",
-            scope="GIGACHAT_API_CORP",
-            credentials=os.environ.get("GIGACHAT_CREDENTIALS"),
-            verify_ssl_certs=False
-        )
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        law_docs = load_pdfs()
-        splits = text_splitter.split_documents(law_docs)
-        self.vectorstore = Chroma.from_documents(documents=splits, embedding=self.embeddings)
-        retriever = self.vectorstore.as_retriever()
+def _build_retrieval_chain(docs: List[Document], system_prompt: str, **chroma_kwargs):
+    """
+    Индексирует документы в Chroma и собирает цепочку ответа по найденному контексту.
+    Chroma, эмбеддинги GigaChat и цепочки langchain импортируются здесь,
+    чтобы не замедлять запуск приложения.
+    """
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_chroma import Chroma
+    from langchain_gigachat.embeddings.gigachat import GigaChatEmbeddings
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    embeddings = GigaChatEmbeddings(
+        model="EmbeddingsGigaR",
+        scope="GIGACHAT_API_CORP",
+        credentials=os.environ.get("GIGACHAT_CREDENTIALS"),
+        verify_ssl_certs=False
+    )
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    splits = text_splitter.split_documents(docs)
+    vectorstore = Chroma.from_documents(documents=splits, embedding=embeddings, **chroma_kwargs)
+    retriever = vectorstore.as_retriever()
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "{input}"),
+    ])
+
+    giga = get_giga_chat()
+    qa_chain = create_stuff_documents_chain(giga, prompt)
+    return embeddings, vectorstore, create_retrieval_chain(retriever, qa_chain)
 
+class RAG230FZEngine:
+    def __init__(self):
         self.system_prompt = (
             "Ты получаешь на вход записи разговора, они представляют собой текстовую транскрибацию разговора по сегментам.\n"
             "Ты должен решить, соблюдается ли закон 230-ФЗ в предоставленном тебе текста разговора.\n"
@@ -43,14 +59,9 @@ class RAG230FZEngine:
             "{context}"
         )
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("human", "{input}"),
-        ])
-
-        giga = get_giga_chat()
-        qa_chain = create_stuff_documents_chain(giga, prompt)
-        self.rag_chain = create_retrieval_chain(retriever, qa_chain)
+        self.embeddings, self.vectorstore, self.rag_chain = _build_retrieval_chain(
+            load_pdfs(), self.system_prompt
+        )
 
     def check_compliance(self, conversation_json: List[TranscriptSegment]) -> str:
         readable_text = json_to_readable_text(conversation_json)
@@ -82,25 +93,8 @@ class RAG230FZEngine:
 
 class RAGChatEngine:
     def __init__(self, base_docs: List[Document]):
-        self.embeddings = GigaChatEmbeddings(
-            model="EmbeddingsGigaR",
-            scope="GIGACHAT_API_CORP",
-            credentials=os.environ.get("GIGACHAT_CREDENTIALS"),
-            verify_ssl_certs=False
-        )
-
         self.temp_dir = tempfile.mkdtemp()
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(base_docs)
-
-        self.vectorstore = Chroma.from_documents(
-            documents=splits,
-            embedding=self.embeddings,
-            persist_directory=self.temp_dir
-        )
-        retriever = self.vectorstore.as_retriever()
-
         self.system_prompt = (
             "Ты ассистент, который отвечает на вопросы, используя только предоставленный ниже текст.\n"
             "Текст представляет из себя сегменты телефонного разговора в формате ([время сегмента] текст) или ([время сегмента]: спикер текст).\n"
@@ -109,14 +103,9 @@ class RAGChatEngine:
             "{context}"
         )
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("human", "{input}"),
-        ])
-
-        giga = get_giga_chat()
-        qa_chain = create_stuff_documents_chain(giga, prompt)
-        self.rag_chain = create_retrieval_chain(retriever, qa_chain)
+        self.embeddings, self.vectorstore, self.rag_chain = _build_retrieval_chain(
+            base_docs, self.system_prompt, persist_directory=self.temp_dir
+        )
 
     def ask(self, question: str) -> str:
         try:
@@ -1,19 +1,24 @@
 import time
 from threading import Lock
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 from langchain_core.documents import Document
 
 from core.schemas import TranscriptSegment
-from utils.rag_engine import RAGChatEngine
+
+# RAG-движок (Chroma, langchain) импортируется при создании первой сессии
+if TYPE_CHECKING:
+    from utils.rag_engine import RAGChatEngine
 
 class SessionManager:
     def __init__(self, ttl_seconds: int = 3600):
-        self._sessions: Dict[str, RAGChatEngine] = {}
+        self._sessions: Dict[str, "RAGChatEngine"] = {}
         self._last_access: Dict[str, float] = {}
         self._lock = Lock()
         self.ttl = ttl_seconds
 
-    def get_or_create_session(self, session_id: str, data: List[Document]) -> RAGChatEngine:
+    def get_or_create_session(self, session_id: str, data: List[Document]) -> "RAGChatEngine":
+        from utils.rag_engine import RAGChatEngine
+
         with self._lock:
             if session_id in self._sessions:
                 self._last_access[session_id] = time.time()
@@ -24,7 +29,7 @@ class SessionManager:
             self._last_access[session_id] = time.time()
             return engine
 
-    def get_session(self, session_id: str) -> Optional[RAGChatEngine]:
+    def get_session(self, session_id: str) -> Optional["RAGChatEngine"]:
         with self._lock:
             engine = self._sessions.get(session_id)
             if engine: